@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 
 import argparse
+import codecs
+import functools
 import os.path
+import re
+import struct
 import sys
 import unicodedata
-from typing import Callable, Dict, List, NamedTuple, Optional, Set
+import zipfile
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
 
 # FAT8 formatting schemes
 
@@ -16,7 +21,8 @@ class KnownFAT8Format(NamedTuple):
     sides: int  # used for matching
     sectors: int  # used for matching
     fat_tracks: int
-    sector1_start_hints: List[Callable[[bytes], bool]]
+    sector1_start_prefixes: Tuple[bytes, ...]  # used for scoring
+    sector1_size_is_128: Optional[bool]  # used for scoring
     charset: str
     obfuscation: str
     metadata_track: int
@@ -37,7 +43,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=80,
         sides=2,
         sectors=16,
-        sector1_start_hints={},
+        sector1_start_prefixes=(),
+        sector1_size_is_128=None,
         charset="pc98-8bit",
         obfuscation="pc98",
         metadata_track=40,
@@ -52,9 +59,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=77,
         sides=2,
         sectors=26,
-        sector1_start_hints={
-            lambda sector1: len(sector1) == 128,
-        },
+        sector1_start_prefixes=(),
+        sector1_size_is_128=True,
         charset="pc98-8bit",
         obfuscation="pc98",
         metadata_track=35,
@@ -69,9 +75,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=77,
         sides=2,
         sectors=26,
-        sector1_start_hints={
-            lambda sector1: len(sector1) == 128,
-        },
+        sector1_start_prefixes=(),
+        sector1_size_is_128=True,
         charset="pc98-8bit",
         obfuscation="pc98",
         metadata_track=35,
@@ -88,7 +93,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=35,
         sides=1,
         sectors=16,
-        sector1_start_hints={},
+        sector1_start_prefixes=(),
+        sector1_size_is_128=None,
         charset="pc98-8bit",
         obfuscation="pc88",
         metadata_track=18,
@@ -105,7 +111,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=40,
         sides=2,
         sectors=16,
-        sector1_start_hints={},
+        sector1_start_prefixes=(),
+        sector1_size_is_128=None,
         charset="pc98-8bit",
         obfuscation="pc88",
         metadata_track=18,
@@ -122,9 +129,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=77,
         sides=2,
         sectors=26,
-        sector1_start_hints={
-            lambda sector1: len(sector1) != 128,
-        },
+        sector1_start_prefixes=(),
+        sector1_size_is_128=False,
         charset="pc98-8bit",
         obfuscation="pc88",
         metadata_track=35,
@@ -139,9 +145,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=35,
         sides=1,
         sectors=16,
-        sector1_start_hints={
-            lambda sector1: sector1.startswith(b"SYS"),
-        },
+        sector1_start_prefixes=(b"SYS",),
+        sector1_size_is_128=None,
         charset="pc6001-8bit",
         obfuscation=None,
         metadata_track=18,
@@ -156,9 +161,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=35,
         sides=1,
         sectors=16,
-        sector1_start_hints={
-            lambda sector1: sector1.startswith(b"SYS"),
-        },
+        sector1_start_prefixes=(b"SYS",),
+        sector1_size_is_128=None,
         charset="pc6001-8bit",
         obfuscation=None,
         metadata_track=18,
@@ -173,9 +177,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=40,
         sides=1,
         sectors=16,
-        sector1_start_hints={
-            lambda sector1: sector1.startswith(b"SYS"),
-        },
+        sector1_start_prefixes=(b"SYS",),
+        sector1_size_is_128=None,
         charset="pc6001-8bit",
         obfuscation=None,
         metadata_track=18,
@@ -190,10 +193,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=80,
         sides=1,
         sectors=16,
-        sector1_start_hints={
-            lambda sector1: sector1.startswith(b"IPL"),
-            lambda sector1: sector1.startswith(b"RXR"),
-        },
+        sector1_start_prefixes=(b"IPL", b"RXR"),
+        sector1_size_is_128=None,
         charset="pc6001-8bit",
         obfuscation=None,
         metadata_track=37,
@@ -208,10 +209,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=80,
         sides=1,
         sectors=16,
-        sector1_start_hints={
-            lambda sector1: sector1.startswith(b"IPL"),
-            lambda sector1: sector1.startswith(b"RXR"),
-        },
+        sector1_start_prefixes=(b"IPL", b"RXR"),
+        sector1_size_is_128=None,
         charset="pc6001-8bit",
         obfuscation=None,
         metadata_track=37,
@@ -226,9 +225,8 @@ KNOWN_FAT8_FORMATS = [
         fat_tracks=40,
         sides=2,
         sectors=16,
-        sector1_start_hints={
-            lambda sector1: sector1.startswith(b"\0\0\0\0"),
-        },
+        sector1_start_prefixes=(b"\0\0\0\0",),
+        sector1_size_is_128=None,
         charset="pc98-8bit",
         obfuscation=None,
         metadata_track=18,
@@ -238,12 +236,90 @@ KNOWN_FAT8_FORMATS = [
     ),
 ]
 
+# candidate formats by the (tracks, sides, sectors) used for matching,
+# in their original order so that ties still go to the earlier entry
+KNOWN_FAT8_FORMATS_BY_GEOMETRY = {
+    geometry: [
+        known_format
+        for known_format in KNOWN_FAT8_FORMATS
+        if (known_format.tracks, known_format.sides, known_format.sectors) == geometry
+    ]
+    for geometry in {
+        (known_format.tracks, known_format.sides, known_format.sectors)
+        for known_format in KNOWN_FAT8_FORMATS
+    }
+}
+
 # 8-bit/single-byte character encoding schemes
 
 NO_CONTROLS = b""
 MINIMAL_CONTROLS = b"\0\r\n\x1a\x7f"
 ASCII_CONTROLS = bytes(range(0x20)) + b"\x7f"
 
+# shared one-byte values for the character maps and encoders below
+SINGLE_BYTES = tuple(bytes([i]) for i in range(256))
+
+
+# decode tables are 256-character strings, the form codecs.charmap_decode
+# takes. cached so that decoding with some other preserve value only
+# builds its table once rather than on every call
+@functools.lru_cache(maxsize=8)
+def make_8bit_decode_table(charset, preserve):
+    preserved = set(preserve)
+    return "".join(chr(i) if i in preserved else charset[i] for i in range(256))
+
+
+# code point ranges of the kana letters; the only ones with
+# compatibility decompositions are the voiced and semi-voiced letters
+HIRAGANA_LETTERS = (0x3041, 0x3096)
+KATAKANA_LETTERS = (0x30A1, 0x30FA)
+
+
+# str.translate table for the encoders' first pass: decompose voiced
+# kana letters into letter + combining mark and substitute lookalikes
+# for a couple of dashes
+def make_8bit_encode_prepass_table(letter_ranges):
+    return {
+        cp: unicodedata.normalize("NFKD", chr(cp))
+        for first, last in letter_ranges
+        for cp in range(first, last + 1)
+        if unicodedata.normalize("NFKD", chr(cp)) != chr(cp)
+    } | {ord("\N{WAVE DASH}"): "~", ord("\N{HYPHEN}"): "-"}
+
+
+# shared by the encoders below: map each character, retrying
+# unmapped ones with the given normalization forms when try_harder
+# is set
+def encode_8bit_charset(
+    s, *, charset_name, prepass_table, charmap, normalization_forms, try_harder
+):
+    s = s.translate(prepass_table)
+    charmap_get = charmap.get
+    byts_list = []
+    for chars_consumed, ch in enumerate(s):
+        byt = charmap_get(ch) or (SINGLE_BYTES[ord(ch)] if ord(ch) <= 0x7F else None)
+        if byt is None and try_harder:
+            for normalization_form in normalization_forms:
+                cch = unicodedata.normalize(normalization_form, ch)
+                byt = charmap_get(cch) or (
+                    SINGLE_BYTES[ord(cch)]
+                    if len(cch) == 1 and ord(cch) <= 0x7F
+                    else None
+                )
+                if byt is not None:
+                    break
+        if byt is None:
+            raise UnicodeEncodeError(
+                charset_name,
+                s,
+                chars_consumed,
+                chars_consumed + 1,
+                f"no mapping for U+{ord(ch):04X} {unicodedata.name(ch, repr(ch))}",
+            )
+        byts_list.append(byt)
+    return b"".join(byts_list)
+
+
 # i am sure this is not the best way to solve this. this mapping
 # should work OK for PC-8001 series, PC-8801 series, and PC-98/PC-9821
 # series and compatibles when displaying an 8-bit character set with
@@ -268,7 +344,11 @@ PC98_8BIT_CHARSET = (
     "═╞╪╡◢◣◥◤♠♥♦♣•￮╱╲╳円年月日時分秒\uf8f4\uf8f5\uf8f6\uf8f7\N{REVERSE SOLIDUS}\uf8f1\uf8f2\uf8f3"
 )
 assert len(PC98_8BIT_CHARSET) == 256
-PC98_8BIT_CHARMAP = {PC98_8BIT_CHARSET[i]: bytes([i]) for i in range(256)}
+PC98_8BIT_DECODE_TABLES = {
+    preserve: make_8bit_decode_table(PC98_8BIT_CHARSET, preserve)
+    for preserve in (NO_CONTROLS, MINIMAL_CONTROLS, ASCII_CONTROLS)
+}
+PC98_8BIT_CHARMAP = {ch: SINGLE_BYTES[i] for i, ch in enumerate(PC98_8BIT_CHARSET)}
 PC98_8BIT_CHARMAP_COMPAT = {
     unicodedata.normalize("NFKD", key): value
     for key, value in PC98_8BIT_CHARMAP.items()
@@ -284,94 +364,58 @@ PC98_8BIT_CHARMAP_COMPAT = {
         "\N{HALFWIDTH KATAKANA-HIRAGANA PROLONGED SOUND MARK}"
     ],
 }
+# one lookup per character; exact mappings win over compatibility ones
+PC98_8BIT_CHARMAP_ALL = PC98_8BIT_CHARMAP_COMPAT | PC98_8BIT_CHARMAP
+PC98_8BIT_ENCODE_PREPASS_TABLE = make_8bit_encode_prepass_table((KATAKANA_LETTERS,))
 
 
+# the encoders are pure, and every decode re-encodes its result to
+# check the round trip, so repeated strings (blank names, padding) are
+# worth caching
+@functools.lru_cache(maxsize=256)
 def encode_pc98_8bit_charset(s, try_harder=True):
-    s = "".join(
-        [
-            (
-                unicodedata.normalize("NFKD", s[i : i + 1])
-                if unicodedata.name(s[i : i + 1], "?")
-                .lower()
-                .startswith("katakana letter")
-                else (
-                    "~"
-                    if s[i : i + 1] == "\N{WAVE DASH}"
-                    else "-" if s[i : i + 1] == "\N{HYPHEN}" else s[i : i + 1]
-                )
-            )
-            for i in range(len(s))
-        ]
+    return encode_8bit_charset(
+        s,
+        charset_name="pc98-8bit",
+        prepass_table=PC98_8BIT_ENCODE_PREPASS_TABLE,
+        charmap=PC98_8BIT_CHARMAP_ALL,
+        normalization_forms=("NFKD",),
+        try_harder=try_harder,
     )
-    byts, chars_consumed, num_chars = b"", 0, len(s)
-    while chars_consumed < num_chars:
-        ch = s[chars_consumed]
-        byt = PC98_8BIT_CHARMAP.get(ch, PC98_8BIT_CHARMAP_COMPAT.get(ch)) or (
-            bytes([ord(ch)]) if ord(ch) <= 0x7F else None
-        )
-        if byt is None and try_harder:
-            cch = unicodedata.normalize("NFKD", ch)
-            byt = PC98_8BIT_CHARMAP.get(cch, PC98_8BIT_CHARMAP_COMPAT.get(cch)) or (
-                bytes([ord(cch)]) if len(cch) == 1 and ord(cch) <= 0x7F else None
-            )
-        if byt is None:
-            raise UnicodeEncodeError(
-                "pc98-8bit",
-                s,
-                chars_consumed,
-                chars_consumed + 1,
-                f"no mapping for U+{ord(ch):04X} {unicodedata.name(ch, repr(ch))}",
-            )
-        byts += byt
-        chars_consumed += 1
-    return byts
 
 
 def decode_pc98_8bit_charset(byts, preserve=MINIMAL_CONTROLS):
-    s, bytes_consumed, num_bytes = "", 0, len(byts)
-    while bytes_consumed < num_bytes:
-        byt = byts[bytes_consumed]
-        s += chr(byt) if byt in preserve else PC98_8BIT_CHARSET[byt]
-        bytes_consumed += 1
-    round_trip_byts = encode_pc98_8bit_charset(s)
-    assert byts == round_trip_byts, UnicodeDecodeError(
-        "pc98-8bit",
-        byts,
-        0,
-        num_bytes,
-        f"round-trip failure for result:\n {repr(byts)}, got:\n {repr(round_trip_byts)}",
-    )
+    decode_table = PC98_8BIT_DECODE_TABLES.get(preserve) or make_8bit_decode_table(
+        PC98_8BIT_CHARSET, preserve
+    )
+    s, num_bytes = codecs.charmap_decode(byts, "strict", decode_table)[0], len(byts)
+    # the round-trip check re-encodes everything, so it is skipped
+    # along with other assertions under python -O
+    if __debug__:
+        round_trip_byts = encode_pc98_8bit_charset(s)
+        assert byts == round_trip_byts, UnicodeDecodeError(
+            "pc98-8bit",
+            byts,
+            0,
+            num_bytes,
+            f"round-trip failure for result:\n {repr(byts)}, got:\n {repr(round_trip_byts)}",
+        )
     return s
 
 
 def smoke_test_pc98_8bit_charset():
     assert decode_pc98_8bit_charset(b"") == ""
     assert encode_pc98_8bit_charset("") == b""
-    round_trip_test_failures = {
-        encode_pc98_8bit_charset(decode_pc98_8bit_charset(bytes([i]))): bytes([i])
-        for i in range(256)
-        if encode_pc98_8bit_charset(decode_pc98_8bit_charset(bytes([i]))) != bytes([i])
-    }
-    round_trip_test_failures.update(
-        {
-            encode_pc98_8bit_charset(decode_pc98_8bit_charset(bytes([i, 0xEE]))): bytes(
-                [i, 0xEE]
-            )
-            for i in range(256)
-            if encode_pc98_8bit_charset(decode_pc98_8bit_charset(bytes([i, 0xEE])))
-            != bytes([i, 0xEE])
-        }
-    )
-    round_trip_test_failures.update(
-        {
-            encode_pc98_8bit_charset(decode_pc98_8bit_charset(bytes([i, 0xEF]))): bytes(
-                [i, 0xEF]
-            )
-            for i in range(256)
-            if encode_pc98_8bit_charset(decode_pc98_8bit_charset(bytes([i, 0xEF])))
-            != bytes([i, 0xEF])
-        }
-    )
+    # each case is round-tripped once and only mismatches are recorded
+    round_trip_test_failures = {}
+    for test_data in (
+        [bytes([i]) for i in range(256)]
+        + [bytes([i, 0xEE]) for i in range(256)]
+        + [bytes([i, 0xEF]) for i in range(256)]
+    ):
+        round_trip_byts = encode_pc98_8bit_charset(decode_pc98_8bit_charset(test_data))
+        if round_trip_byts != test_data:
+            round_trip_test_failures[round_trip_byts] = test_data
     assert not round_trip_test_failures, round_trip_test_failures
     unicode_test = (
         "\r\n".join(
@@ -555,9 +599,29 @@ PC6001_8BIT_CHARSET = (
     "たちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわん\uf8f2\uf8f3"
 )
 assert len(PC6001_8BIT_CHARSET) == 256
+PC6001_8BIT_DECODE_TABLES = {
+    preserve: make_8bit_decode_table(PC6001_8BIT_CHARSET, preserve)
+    for preserve in (NO_CONTROLS, MINIMAL_CONTROLS, ASCII_CONTROLS)
+}
 PC6001_8BIT_ALTCHARSET = "\uf8f1月火水木金土日年円時分秒百千万" "π┴┬┤├┼│─┌┐└┘╳大中小"
 assert len(PC6001_8BIT_ALTCHARSET) == 32
-PC6001_8BIT_CHARMAP = {PC6001_8BIT_CHARSET[i]: bytes([i]) for i in range(256)} | {
+# the only bytes the decoder cannot map on their own: alternate
+# character set codes following 0x14, and the halfwidth (semi-)voiced
+# sound marks that may combine with a preceding hiragana letter
+PC6001_8BIT_DECODE_SPECIAL_BYTES = re.compile(rb"(?<=\x14)[\x30-\x4f]|[\xde\xdf]")
+# NFKC forms of every hiragana letter followed by a halfwidth
+# (semi-)voiced sound mark, e.g. "か" + "ﾞ" -> "が"
+PC6001_8BIT_HIRAGANA_WITH_SOUND_MARKS = {
+    chr(cp) + mark: unicodedata.normalize("NFKC", chr(cp) + mark)
+    for cp in range(HIRAGANA_LETTERS[0], HIRAGANA_LETTERS[1] + 1)
+    for mark in (
+        "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}",
+        "\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}",
+    )
+}
+PC6001_8BIT_CHARMAP = {
+    ch: SINGLE_BYTES[i] for i, ch in enumerate(PC6001_8BIT_CHARSET)
+} | {
     PC6001_8BIT_ALTCHARSET[i]: bytes([0x14, i + 0x30]) for i in range(32)
 }
 PC6001_8BIT_CHARMAP_COMPAT = {
@@ -575,93 +639,58 @@ PC6001_8BIT_CHARMAP_COMPAT = {
         "\N{HALFWIDTH KATAKANA-HIRAGANA PROLONGED SOUND MARK}"
     ],
 }
+# one lookup per character; exact mappings win over compatibility ones
+PC6001_8BIT_CHARMAP_ALL = PC6001_8BIT_CHARMAP_COMPAT | PC6001_8BIT_CHARMAP
+PC6001_8BIT_ENCODE_PREPASS_TABLE = make_8bit_encode_prepass_table(
+    (HIRAGANA_LETTERS, KATAKANA_LETTERS)
+)
 
 
+@functools.lru_cache(maxsize=256)
 def encode_pc6001_8bit_charset(s, try_harder=True):
-    s = "".join(
-        [
-            (
-                unicodedata.normalize("NFKD", s[i : i + 1])
-                if (
-                    unicodedata.name(s[i : i + 1], "?")
-                    .lower()
-                    .startswith("hiragana letter")
-                    or unicodedata.name(s[i : i + 1], "?")
-                    .lower()
-                    .startswith("katakana letter")
-                )
-                else (
-                    "~"
-                    if s[i : i + 1] == "\N{WAVE DASH}"
-                    else "-" if s[i : i + 1] == "\N{HYPHEN}" else s[i : i + 1]
-                )
-            )
-            for i in range(len(s))
-        ]
+    return encode_8bit_charset(
+        s,
+        charset_name="pc6001-8bit",
+        prepass_table=PC6001_8BIT_ENCODE_PREPASS_TABLE,
+        charmap=PC6001_8BIT_CHARMAP_ALL,
+        normalization_forms=("NFKD", "NFC"),
+        try_harder=try_harder,
     )
-    byts, chars_consumed, num_chars = b"", 0, len(s)
-    while chars_consumed < num_chars:
-        ch = s[chars_consumed]
-        byt = PC6001_8BIT_CHARMAP.get(ch, PC6001_8BIT_CHARMAP_COMPAT.get(ch)) or (
-            bytes([ord(ch)]) if ord(ch) <= 0x7F else None
-        )
-        if byt is None and try_harder:
-            cch = unicodedata.normalize("NFKD", ch)
-            byt = PC6001_8BIT_CHARMAP.get(cch, PC6001_8BIT_CHARMAP_COMPAT.get(cch)) or (
-                bytes([ord(cch)]) if len(cch) == 1 and ord(cch) <= 0x7F else None
-            )
-        if byt is None and try_harder:
-            cch = unicodedata.normalize("NFC", ch)
-            byt = PC6001_8BIT_CHARMAP.get(cch, PC6001_8BIT_CHARMAP_COMPAT.get(cch)) or (
-                bytes([ord(cch)]) if len(cch) == 1 and ord(cch) <= 0x7F else None
-            )
-        if byt is None:
-            raise UnicodeEncodeError(
-                "pc6001-8bit",
-                s,
-                chars_consumed,
-                chars_consumed + 1,
-                f"no mapping for U+{ord(ch):04X} {unicodedata.name(ch, repr(ch))}",
-            )
-        byts += byt
-        chars_consumed += 1
-    return byts
 
 
 def decode_pc6001_8bit_charset(byts, preserve=MINIMAL_CONTROLS):
-    s, bytes_consumed, num_bytes = "", 0, len(byts)
-    while bytes_consumed < num_bytes:
+    decode_table = PC6001_8BIT_DECODE_TABLES.get(
+        preserve
+    ) or make_8bit_decode_table(PC6001_8BIT_CHARSET, preserve)
+    # runs of ordinary bytes are decoded in one pass, and only the
+    # special bytes are handled one at a time. one character per list
+    # element, so the look-back below only ever touches the last two
+    # elements instead of re-slicing s
+    plain_chars = codecs.charmap_decode(byts, "strict", decode_table)[0]
+    chars, plain_start, num_bytes = [], 0, len(byts)
+    for special_byte in PC6001_8BIT_DECODE_SPECIAL_BYTES.finditer(byts):
+        bytes_consumed = special_byte.start()
+        chars += plain_chars[plain_start:bytes_consumed]
+        plain_start = bytes_consumed + 1
         byt = byts[bytes_consumed]
-        if (
-            bytes_consumed > 0
-            and byts[bytes_consumed - 1] == 0x14
-            and byt >= 0x30
-            and byt <= 0x4F
-        ):
-            s = (
-                s[: -len(PC6001_8BIT_CHARSET[0x14])]
-                + PC6001_8BIT_ALTCHARSET[byt - 0x30]
-            )
-        elif byt in preserve:
-            s += chr(byt)
-        else:
-            s += PC6001_8BIT_CHARSET[byt]
-        if (
-            len(s) > 1
-            and s[-1:]
-            in "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
-            and unicodedata.name(s[-2:-1], "?").lower().startswith("hiragana letter")
-        ):
-            s = s[:-2] + unicodedata.normalize("NFKC", s[-2:])
-        bytes_consumed += 1
-    round_trip_byts = encode_pc6001_8bit_charset(s)
-    assert byts == round_trip_byts, UnicodeDecodeError(
-        "pc6001-8bit",
-        byts,
-        0,
-        num_bytes,
-        f"round-trip failure for {repr(s)} with preserve={repr(preserve)}; result:\n {repr(byts)}, got:\n {repr(round_trip_byts)}",
-    )
+        if byt <= 0x4F:
+            chars[-1] = PC6001_8BIT_ALTCHARSET[byt - 0x30]
+            continue
+        chars.append(decode_table[byt])
+        combined = PC6001_8BIT_HIRAGANA_WITH_SOUND_MARKS.get("".join(chars[-2:]))
+        if combined is not None:
+            chars[-2:] = combined
+    chars += plain_chars[plain_start:]
+    s = "".join(chars)
+    if __debug__:
+        round_trip_byts = encode_pc6001_8bit_charset(s)
+        assert byts == round_trip_byts, UnicodeDecodeError(
+            "pc6001-8bit",
+            byts,
+            0,
+            num_bytes,
+            f"round-trip failure for {repr(s)} with preserve={repr(preserve)}; result:\n {repr(byts)}, got:\n {repr(round_trip_byts)}",
+        )
     return s
 
 
@@ -676,42 +705,19 @@ def smoke_test_pc6001_8bit_charset():
     assert encode_pc6001_8bit_charset("␔") == b"\x14"
     assert encode_pc6001_8bit_charset("\x14") == b"\x14"
     assert encode_pc6001_8bit_charset("\x14\x4f") == b"\x14\x4f"
-    round_trip_test_failures = {
-        encode_pc6001_8bit_charset(decode_pc6001_8bit_charset(bytes([i]))): bytes([i])
-        for i in range(256)
-        if encode_pc6001_8bit_charset(decode_pc6001_8bit_charset(bytes([i])))
-        != bytes([i])
-    }
-    round_trip_test_failures.update(
-        {
-            encode_pc6001_8bit_charset(
-                decode_pc6001_8bit_charset(bytes([0x14, i]))
-            ): bytes([0x14, i])
-            for i in range(256)
-            if encode_pc6001_8bit_charset(decode_pc6001_8bit_charset(bytes([0x14, i])))
-            != bytes([0x14, i])
-        }
-    )
-    round_trip_test_failures.update(
-        {
-            encode_pc6001_8bit_charset(
-                decode_pc6001_8bit_charset(bytes([i, 0xEE]))
-            ): bytes([i, 0xEE])
-            for i in range(256)
-            if encode_pc6001_8bit_charset(decode_pc6001_8bit_charset(bytes([i, 0xEE])))
-            != bytes([i, 0xEE])
-        }
-    )
-    round_trip_test_failures.update(
-        {
-            encode_pc6001_8bit_charset(
-                decode_pc6001_8bit_charset(bytes([i, 0xEF]))
-            ): bytes([i, 0xEF])
-            for i in range(256)
-            if encode_pc6001_8bit_charset(decode_pc6001_8bit_charset(bytes([i, 0xEF])))
-            != bytes([i, 0xEF])
-        }
-    )
+    # each case is round-tripped once and only mismatches are recorded
+    round_trip_test_failures = {}
+    for test_data in (
+        [bytes([i]) for i in range(256)]
+        + [bytes([0x14, i]) for i in range(256)]
+        + [bytes([i, 0xEE]) for i in range(256)]
+        + [bytes([i, 0xEF]) for i in range(256)]
+    ):
+        round_trip_byts = encode_pc6001_8bit_charset(
+            decode_pc6001_8bit_charset(test_data)
+        )
+        if round_trip_byts != test_data:
+            round_trip_test_failures[round_trip_byts] = test_data
     assert not round_trip_test_failures, round_trip_test_failures
     unicode_test = (
         "\r\n".join(
@@ -869,9 +875,124 @@ def smoke_test_pc6001_8bit_charset():
         ), f"decode_pc6001_8bit_charset(encode_pc6001_8bit_charset({repr(test_data)})) returned:\n {repr(decode_pc6001_8bit_charset(encode_pc6001_8bit_charset(test_data)))}, expecting:\n {repr(expected_result)}"
 
 
+# codec registry entries, so callers can use e.g.
+# byts.decode("pc98-8bit") and s.encode("pc6001-8bit"), or
+# open(..., encoding="pc98-8bit") for text files. only strict error
+# handling is supported. the last element lists the bytes whose
+# decoding can still change depending on the byte after them;
+# incremental decoding holds trailing runs of these back until more
+# input (or the end of input) arrives
+PC_8BIT_CODECS = {
+    "pc98-8bit": (encode_pc98_8bit_charset, decode_pc98_8bit_charset, b""),
+    "pc6001-8bit": (
+        encode_pc6001_8bit_charset,
+        decode_pc6001_8bit_charset,
+        bytes(
+            byt
+            for byt, ch in enumerate(PC6001_8BIT_CHARSET)
+            if byt in (0x14, 0xDE, 0xDF)
+            or HIRAGANA_LETTERS[0] <= ord(ch) <= HIRAGANA_LETTERS[1]
+        ),
+    ),
+}
+
+
+def make_pc_8bit_codec_info(name):
+    encode_8bit_charset, decode_8bit_charset, carry_bytes = PC_8BIT_CODECS[name]
+
+    def encode(s, errors="strict"):
+        assert errors == "strict", f"{name} only supports strict error handling"
+        return encode_8bit_charset(s), len(s)
+
+    def decode(byts, errors="strict"):
+        assert errors == "strict", f"{name} only supports strict error handling"
+        return decode_8bit_charset(bytes(byts)), len(byts)
+
+    # both encoders map each character on its own, so chunks can be
+    # encoded as they arrive
+    class IncrementalEncoder(codecs.IncrementalEncoder):
+        def encode(self, s, final=False):
+            return encode(s, self.errors)[0]
+
+    class IncrementalDecoder(codecs.BufferedIncrementalDecoder):
+        def _buffer_decode(self, byts, errors, final):
+            if not final:
+                byts = byts.rstrip(carry_bytes)
+            return decode(byts, errors)
+
+    return codecs.CodecInfo(
+        encode=encode,
+        decode=decode,
+        incrementalencoder=IncrementalEncoder,
+        incrementaldecoder=IncrementalDecoder,
+        name=name,
+    )
+
+
+def search_pc_8bit_codecs(encoding):
+    # the codec machinery hands us lowercased names with hyphens turned
+    # into underscores
+    for name in PC_8BIT_CODECS:
+        if encoding == name.replace("-", "_"):
+            return make_pc_8bit_codec_info(name)
+    return None
+
+
+codecs.register(search_pc_8bit_codecs)
+
+
+def smoke_test_pc_8bit_codecs():
+    for name, (
+        encode_8bit_charset,
+        decode_8bit_charset,
+        carry_bytes,
+    ) in PC_8BIT_CODECS.items():
+        test_data = bytes(range(256))
+        assert test_data.decode(name) == decode_8bit_charset(
+            test_data
+        ), f"{repr(test_data)}.decode({repr(name)}) returned:\n {repr(test_data.decode(name))}, expecting:\n {repr(decode_8bit_charset(test_data))}"
+        assert (
+            test_data.decode(name).encode(name) == test_data
+        ), f"{repr(test_data)}.decode({repr(name)}).encode({repr(name)}) returned:\n {repr(test_data.decode(name).encode(name))}, expecting:\n {repr(test_data)}"
+        # feeding one byte or character at a time must not change the result
+        test_data += b"\x14\x30\x14\x14\x4f\xb6\xde\x96\xde\xde\xea\xdf\x14"
+        incremental_s = "".join(
+            codecs.iterdecode((SINGLE_BYTES[byt] for byt in test_data), name)
+        )
+        assert incremental_s == decode_8bit_charset(
+            test_data
+        ), f"incremental {name} decoding returned:\n {repr(incremental_s)}, expecting:\n {repr(decode_8bit_charset(test_data))}"
+        incremental_byts = b"".join(codecs.iterencode(iter(incremental_s), name))
+        assert (
+            incremental_byts == test_data
+        ), f"incremental {name} encoding returned:\n {repr(incremental_byts)}, expecting:\n {repr(test_data)}"
+
+
 # File data obfuscation schemes
 
 no_obfuscation = lambda i, byt: byt
+no_obfuscation_bytes = lambda byts: bytes(byts)
+
+
+# whole-buffer (de)obfuscation: the schemes here only depend on the
+# byte offset modulo some period, so one 256-entry translation table
+# per offset in the period lets bytes.translate do the per-byte work
+
+
+def make_obfuscation_tables(obfuscation_byte, period):
+    return tuple(
+        bytes(obfuscation_byte(i, byt) for byt in range(256)) for i in range(period)
+    )
+
+
+def translate_periodic(byts, tables):
+    byts, period = bytes(byts), len(tables)
+    if period == 1:
+        return byts.translate(tables[0])
+    translated = bytearray(len(byts))
+    for i, table in enumerate(tables[: len(byts)]):
+        translated[i::period] = byts[i::period].translate(table)
+    return bytes(translated)
 
 
 def deobfuscate_byte_pc98(i, byt):
@@ -884,6 +1005,18 @@ def obfuscate_byte_pc98(i, byt):
     return ((byt & 0xFE) >> 1) | ((byt & 0x01) << 7)
 
 
+PC98_DEOBFUSCATION_TABLES = make_obfuscation_tables(deobfuscate_byte_pc98, 1)
+PC98_OBFUSCATION_TABLES = make_obfuscation_tables(obfuscate_byte_pc98, 1)
+
+
+def deobfuscate_bytes_pc98(byts):
+    return translate_periodic(byts, PC98_DEOBFUSCATION_TABLES)
+
+
+def obfuscate_bytes_pc98(byts):
+    return translate_periodic(byts, PC98_OBFUSCATION_TABLES)
+
+
 def smoke_test_pc98_deobfuscation():
     # Ensure every byte round-trips at offset zero, and also ensure a
     # few selected bytes convert correctly at many different offsets. the
@@ -922,6 +1055,14 @@ def smoke_test_pc98_deobfuscation():
         assert obfuscate_byte_pc98(i, 0x04) == 0x02
         assert obfuscate_byte_pc98(i, 0x02) == 0x01
         assert obfuscate_byte_pc98(i, 0x01) == 0x80
+    # whole-buffer conversions must match the byte-at-a-time ones
+    test_data = bytes(range(256)) * 3
+    assert deobfuscate_bytes_pc98(test_data) == bytes(
+        [deobfuscate_byte_pc98(i, byt) for i, byt in enumerate(test_data)]
+    )
+    assert obfuscate_bytes_pc98(test_data) == bytes(
+        [obfuscate_byte_pc98(i, byt) for i, byt in enumerate(test_data)]
+    )
 
 
 # NEC PC-88 obfuscated ("encrypted") BASIC saves use a pair of XOR
@@ -983,45 +1124,83 @@ PC88_KEY_RECOVERY_BASIC = (
 )
 
 # Here's the combined key material from CK.DAT:
-PC88_COMBINED_KEY = bytes.fromhex(
-    "C0CFCC8562810C42C304E5E6CD"
-    "1175B690E49735EDB2FC6E3777"
-    "6B603086DD384415392DD44D62"
-    "ED760929ACC0CFC48357C1CB74"
-    "D4D978D1271175BE96D1D7F2DB"
-    "A521F3009D6B603880E8788323"
-    "2EF0497A88ED76012F998008F2"
-    "948A5CFC9ED4D970D71251B288"
-    "810C4AC531A521FB06A82BA70E"
-    "9735E5B4C92EF0417CBDADB137"
-    "38441D3F18948A54FAAB941E46"
+PC88_COMBINED_KEY = (
+    b"\xC0\xCF\xCC\x85\x62\x81\x0C\x42\xC3\x04\xE5\xE6\xCD"
+    b"\x11\x75\xB6\x90\xE4\x97\x35\xED\xB2\xFC\x6E\x37\x77"
+    b"\x6B\x60\x30\x86\xDD\x38\x44\x15\x39\x2D\xD4\x4D\x62"
+    b"\xED\x76\x09\x29\xAC\xC0\xCF\xC4\x83\x57\xC1\xCB\x74"
+    b"\xD4\xD9\x78\xD1\x27\x11\x75\xBE\x96\xD1\xD7\xF2\xDB"
+    b"\xA5\x21\xF3\x00\x9D\x6B\x60\x38\x80\xE8\x78\x83\x23"
+    b"\x2E\xF0\x49\x7A\x88\xED\x76\x01\x2F\x99\x80\x08\xF2"
+    b"\x94\x8A\x5C\xFC\x9E\xD4\xD9\x70\xD7\x12\x51\xB2\x88"
+    b"\x81\x0C\x4A\xC5\x31\xA5\x21\xFB\x06\xA8\x2B\xA7\x0E"
+    b"\x97\x35\xE5\xB4\xC9\x2E\xF0\x41\x7C\xBD\xAD\xB1\x37"
+    b"\x38\x44\x1D\x3F\x18\x94\x8A\x54\xFA\xAB\x94\x1E\x46"
 )
 
+# the 11- and 13-byte countdown keys repeat with the same period as
+# the combined key, so all three can be indexed with i % (11 * 13).
+# obfuscation subtracts the 13-byte key and adds the 11-byte one;
+# deobfuscation undoes that by subtracting the 11-byte key and adding
+# the 13-byte one.
+PC88_COUNTDOWN_KEY_11 = bytes(range(11, 0, -1)[i % 11] for i in range(11 * 13))
+PC88_COUNTDOWN_KEY_13 = bytes(range(13, 0, -1)[i % 13] for i in range(11 * 13))
+
 
 def deobfuscate_byte_pc88(i, byt):
     # PC88 BASIC uses the same algorithm as
     # https://robhagemans.github.io/pcbasic/doc/2.0/#protected-file-format
     # but different key material.
+    i %= 11 * 13
     return (
-        range(13, 0, -1)[i % 13]
-        + (
-            ((byt + 0x100 - range(11, 0, -1)[i % 11]) % 0x100)
-            ^ PC88_COMBINED_KEY[i % (11 * 13)]
-        )
-    ) % 0x100
+        PC88_COUNTDOWN_KEY_13[i]
+        + (((byt - PC88_COUNTDOWN_KEY_11[i]) & 0xFF) ^ PC88_COMBINED_KEY[i])
+    ) & 0xFF
 
 
 def obfuscate_byte_pc88(i, byt):
     # PC88 BASIC uses the same algorithm as
     # https://robhagemans.github.io/pcbasic/doc/2.0/#protected-file-format
     # but different key material.
+    i %= 11 * 13
     return (
-        range(11, 0, -1)[i % 11]
-        + (
-            ((byt + 0x100 - range(13, 0, -1)[i % 13]) % 0x100)
-            ^ PC88_COMBINED_KEY[i % (11 * 13)]
-        )
-    ) % 0x100
+        PC88_COUNTDOWN_KEY_11[i]
+        + (((byt - PC88_COUNTDOWN_KEY_13[i]) & 0xFF) ^ PC88_COMBINED_KEY[i])
+    ) & 0xFF
+
+
+def make_pc88_deobfuscation_table(i):
+    # same steps as deobfuscate_byte_pc88, applied to all 256 byte
+    # values at once: rotate for the subtraction and addition, and XOR
+    # the whole table as one big integer
+    identity = bytes(range(256))
+    sub, key, add = (
+        PC88_COUNTDOWN_KEY_11[i],
+        PC88_COMBINED_KEY[i],
+        PC88_COUNTDOWN_KEY_13[i],
+    )
+    table = identity[-sub:] + identity[:-sub]
+    table = (
+        int.from_bytes(table, "big") ^ int.from_bytes(bytes([key]) * 256, "big")
+    ).to_bytes(256, "big")
+    return table.translate(identity[add:] + identity[:add])
+
+
+PC88_DEOBFUSCATION_TABLES = tuple(
+    make_pc88_deobfuscation_table(i) for i in range(11 * 13)
+)
+# each deobfuscation table is a permutation, so obfuscation is its inverse
+PC88_OBFUSCATION_TABLES = tuple(
+    bytes.maketrans(table, bytes(range(256))) for table in PC88_DEOBFUSCATION_TABLES
+)
+
+
+def deobfuscate_bytes_pc88(byts):
+    return translate_periodic(byts, PC88_DEOBFUSCATION_TABLES)
+
+
+def obfuscate_bytes_pc88(byts):
+    return translate_periodic(byts, PC88_OBFUSCATION_TABLES)
 
 
 def smoke_test_p88_deobfuscation():
@@ -1091,12 +1270,28 @@ def smoke_test_p88_deobfuscation():
         assert obfuscate_byte_pc88(i, deobfuscate_byte_pc88(i, 0x55)) == 0x55
         assert obfuscate_byte_pc88(i, deobfuscate_byte_pc88(i, 0xAA)) == 0xAA
         assert obfuscate_byte_pc88(i, deobfuscate_byte_pc88(i, 0xFF)) == 0xFF
+    # whole-buffer conversions must match the byte-at-a-time ones,
+    # including short buffers and ones that are not a multiple of the
+    # combined XOR key length
+    assert deobfuscate_bytes_pc88(ct) == dc
+    assert obfuscate_bytes_pc88(kp) == ct
+    for test_data in (b"", b"\xff", bytes(range(256)) * 3):
+        assert deobfuscate_bytes_pc88(test_data) == bytes(
+            [deobfuscate_byte_pc88(i, byt) for i, byt in enumerate(test_data)]
+        )
+        assert obfuscate_bytes_pc88(test_data) == bytes(
+            [obfuscate_byte_pc88(i, byt) for i, byt in enumerate(test_data)]
+        )
 
 
 TRACK_TABLE_OFFSET = 0x20
 TRACK_ENTRY_SIZE = 4
 SECTOR_HEADER_SIZE = 16
 
+# little-endian fields in D88 headers
+U16_LE = struct.Struct("<H")
+U32_LE = struct.Struct("<I")
+
 DISK_ATTR_WRITE_PROTECTED = "DiskWriteProtected"
 
 
@@ -1113,9 +1308,12 @@ def make_disk_info(**kw) -> DiskInfo:
 
 
 def analyze_disk(*, d88_data: bytes, disk_idx: int):
+    assert (
+        len(d88_data) >= TRACK_TABLE_OFFSET
+    ), f"Is this a D88 file? The disk header is truncated"
     disk_name_or_comment = d88_data[:0x10].rstrip(b"\0") or None
     disk_attrs = {DISK_ATTR_WRITE_PROTECTED} if d88_data[0x1A] & 0x10 else set()
-    disk_sz = int.from_bytes(d88_data[0x1C:0x20], "little")
+    (disk_sz,) = U32_LE.unpack_from(d88_data, 0x1C)
     assert disk_sz <= len(
         d88_data
     ), f"Is this a D88 file? The disk size field is too large"
@@ -1123,18 +1321,15 @@ def analyze_disk(*, d88_data: bytes, disk_idx: int):
         disk_sz > TRACK_TABLE_OFFSET + TRACK_ENTRY_SIZE
     ), f"Is this a D88 file? The disk size field is too small"
     track_offsets: List[int] = []
-    i = 0
-    while True:
+    # the track table ends where the first track's data begins, which is
+    # only known as offsets are read, so entries are unpacked lazily
+    track_table = memoryview(d88_data)[
+        TRACK_TABLE_OFFSET : len(d88_data)
+        - (len(d88_data) - TRACK_TABLE_OFFSET) % TRACK_ENTRY_SIZE
+    ]
+    for i, (offset,) in enumerate(U32_LE.iter_unpack(track_table)):
         if i > 0 and (TRACK_TABLE_OFFSET + TRACK_ENTRY_SIZE * i) >= min(track_offsets):
             break
-        offset = int.from_bytes(
-            d88_data[
-                TRACK_TABLE_OFFSET
-                + i * TRACK_ENTRY_SIZE : TRACK_TABLE_OFFSET
-                + (i + 1) * TRACK_ENTRY_SIZE
-            ],
-            "little",
-        )
         if i == 0:
             assert (
                 offset - TRACK_TABLE_OFFSET
@@ -1149,7 +1344,6 @@ def analyze_disk(*, d88_data: bytes, disk_idx: int):
             assert (
                 offset + SECTOR_HEADER_SIZE < disk_sz
             ), f"Is this a D88 file? Track data spills over past the end"
-        i += 1
     return make_disk_info(
         disk_name_or_comment=disk_name_or_comment,
         disk_attrs=disk_attrs,
@@ -1200,7 +1394,7 @@ def make_track_and_side(**kw) -> TrackAndSide:
 class SectorInfo(NamedTuple):
     sec_num: int
     actual_data_offset: int
-    sector_data: bytes
+    sector_data_size: int
     sectors_in_track: int
 
 
@@ -1209,6 +1403,7 @@ def make_sector_info(**kw) -> SectorInfo:
 
 
 class TrackAndSectorInfo(NamedTuple):
+    d88_data: bytes
     track_sector_map: Dict[TrackAndSide, List[SectorInfo]]
     nominal_sectors_in_track: Dict[TrackAndSide, int]
     found_tracks: int
@@ -1223,76 +1418,98 @@ def make_track_and_sector_info(**kw) -> TrackAndSectorInfo:
     return TrackAndSectorInfo(**kw)
 
 
+def get_sector_data(
+    sector_info: SectorInfo, *, track_and_sector_info: TrackAndSectorInfo
+) -> bytes:
+    # sector payloads are only sliced out of the D88 image when needed
+    return track_and_sector_info.d88_data[
+        sector_info.actual_data_offset : sector_info.actual_data_offset
+        + sector_info.sector_data_size
+    ]
+
+
 def analyze_tracks_and_sectors(*, d88_data: bytes, disk_info: DiskInfo, logger: Logger):
     logger.append("\n== Track/Sector Table ==")
     track_sector_map: Dict[TrackAndSide, List[SectorInfo]] = {}
 
     all_sector_ranges = []
     nominal_sectors_in_track: Dict[TrackAndSide, int] = {}
+    # per-track (data size, largest sector size, largest sector number),
+    # kept alongside track_sector_map so a later track with the same
+    # track/side replaces the earlier one's statistics too
+    track_stats: Dict[TrackAndSide, tuple] = {}
     for track_offset in disk_info.track_offsets:
         sectors: List[SectorInfo] = []
+        track_sec_nums: Set[int] = set()
+        track_data_size, track_largest_sector_size, track_max_sec_num = 0, 0, 0
         cursor = track_offset
         track_num, side_num = None, None
         while cursor + SECTOR_HEADER_SIZE <= disk_info.disk_sz:
-            header = d88_data[cursor : cursor + SECTOR_HEADER_SIZE]
-            trk = header[0]
+            # sector header fields are read in place rather than from a
+            # sliced copy of the header
+            trk = d88_data[cursor]
             if track_num is None:
                 track_num = trk
             if track_num != trk:
                 break
-            side = header[1]
+            side = d88_data[cursor + 0x01]
             if side_num is None:
                 side_num = side
+                # every sector after the first shares this track and side
+                track_and_side = make_track_and_side(track=track_num, side=side_num)
             if side_num != side:
                 break
-            sec_num = header[2]
-            sec_size_code = header[3]
+            sec_num = d88_data[cursor + 0x02]
+            sec_size_code = d88_data[cursor + 0x03]
             nominal_data_size = 128 << sec_size_code
-            sectors_in_track = int.from_bytes(header[0x04:0x06], "little")
+            (sectors_in_track,) = U16_LE.unpack_from(d88_data, cursor + 0x04)
             actual_data_offset = cursor + SECTOR_HEADER_SIZE
             if False:
                 # FIXME: apparently this field is often wrong; need to
                 # figure out how to detect that and use it when it is
                 # correct (it would allow custom sector sizes and empty
                 # sectors)
-                sector_data_size = int.from_bytes(header[0x0E:], "little")
+                (sector_data_size,) = U16_LE.unpack_from(d88_data, cursor + 0x0E)
             else:
                 sector_data_size = nominal_data_size
             assert (
                 actual_data_offset + sector_data_size <= disk_info.disk_sz
             ), "Is this a D88 file? Sector data spilled off the end"
-            for other_sector in sectors:
-                assert (
-                    other_sector.sec_num != sec_num
-                ), f"Is this a D88 file? Track {trk:3}, Side {side}, Sector {sec_num:2} appears more than once"
+            assert (
+                sec_num not in track_sec_nums
+            ), f"Is this a D88 file? Track {trk:3}, Side {side}, Sector {sec_num:2} appears more than once"
+            track_sec_nums.add(sec_num)
             sectors.append(
                 make_sector_info(
                     sec_num=sec_num,
                     actual_data_offset=actual_data_offset,
-                    sector_data=d88_data[
-                        actual_data_offset : actual_data_offset + sector_data_size
-                    ],
+                    sector_data_size=sector_data_size,
                     sectors_in_track=sectors_in_track,
                 )
             )
-            nominal_sectors_in_track[make_track_and_side(track=trk, side=side)] = (
-                nominal_sectors_in_track.get(
-                    make_track_and_side(track=trk, side=side), sectors_in_track
-                )
+            nominal_sectors = nominal_sectors_in_track.setdefault(
+                track_and_side, sectors_in_track
             )
             assert (
-                nominal_sectors_in_track[make_track_and_side(track=trk, side=side)]
-                == sectors_in_track
-            ), f"Is this a damaged disk? Sectors-per-track varies in Track {trk:3}, Side {side}: {nominal_sectors_in_track[make_track_and_side(track=trk, side=side)]} vs {sectors_in_track}"
+                nominal_sectors == sectors_in_track
+            ), f"Is this a damaged disk? Sectors-per-track varies in Track {trk:3}, Side {side}: {nominal_sectors} vs {sectors_in_track}"
             all_sector_ranges.append(
                 [actual_data_offset, actual_data_offset + sector_data_size]
             )
+            track_data_size += sector_data_size
+            track_largest_sector_size = max(track_largest_sector_size, sector_data_size)
+            track_max_sec_num = max(track_max_sec_num, sec_num)
             cursor += SECTOR_HEADER_SIZE + sector_data_size
         key = make_track_and_side(track=track_num, side=side_num)
         track_sector_map[key] = sectors
+        track_stats[key] = (
+            track_data_size,
+            track_largest_sector_size,
+            track_max_sec_num,
+        )
         logger.append(
             f"Track {track_num:3}, Side {side_num}: "
-            + ", ".join(f"{s.sec_num:2}:{len(s.sector_data)}" for s in sectors)
+            + ", ".join(f"{s.sec_num:2}:{s.sector_data_size}" for s in sectors)
         )
 
     overlap_check_offset = 0
@@ -1309,16 +1526,20 @@ def analyze_tracks_and_sectors(*, d88_data: bytes, disk_info: DiskInfo, logger:
     found_disk_size = 0
     largest_sector_size = 0
 
-    for track_and_side, sectors in track_sector_map.items():
+    for track_and_side, (
+        track_data_size,
+        track_largest_sector_size,
+        track_max_sec_num,
+    ) in track_stats.items():
         found_tracks = max(found_tracks, 1 + track_and_side.track)
         found_sides = max(found_sides, 1 + track_and_side.side)
-        for sector_info in sectors:
-            found_total_sectors += 1
-            found_disk_size += len(sector_info.sector_data)
-            largest_sector_size = max(largest_sector_size, len(sector_info.sector_data))
-            found_sectors = max(found_sectors, sector_info.sec_num)
+        found_total_sectors += len(track_sector_map[track_and_side])
+        found_disk_size += track_data_size
+        largest_sector_size = max(largest_sector_size, track_largest_sector_size)
+        found_sectors = max(found_sectors, track_max_sec_num)
 
     return make_track_and_sector_info(
+        d88_data=d88_data,
         track_sector_map=track_sector_map,
         nominal_sectors_in_track=nominal_sectors_in_track,
         found_tracks=found_tracks,
@@ -1358,6 +1579,8 @@ class FAT8Info(NamedTuple):
     fat8_obfuscation: Optional[str]
     deobfuscate_byte: Callable[[int, int], int]
     obfuscate_byte: Callable[[int, int], int]
+    deobfuscate_bytes: Callable[[bytes], bytes]
+    obfuscate_bytes: Callable[[bytes], bytes]
     fat8_disk_size: int
     fat8_bytes_per_track: int
     fat8_clusters_per_track: int
@@ -1374,15 +1597,79 @@ def make_fat8_info(**kw) -> FAT8Info:
     return FAT8Info(**kw)
 
 
+# metadata sectors are small and are decoded more than once (and the
+# FAT copies are usually identical), so their decoded text is cached;
+# so are directory entry names and extensions, which often repeat
+@functools.lru_cache(maxsize=1024)
+def decode_8bit_metadata(byts, preserve=MINIMAL_CONTROLS, *, fat8_info: FAT8Info):
+    return fat8_info.decode_8bit_charset(byts, preserve=preserve)
+
+
+# heuristic format variant -> (format name, first metadata cluster,
+# charset, obfuscation)
+FAT8_HEURISTIC_VARIANTS = {
+    "pc66sr": (
+        "PC-6001 mkII SR/6601 SR",
+        FAT8_FIRST_METADATA_CLUSTER_PC66SR,
+        ("pc6001-8bit", decode_pc6001_8bit_charset, encode_pc6001_8bit_charset),
+        (
+            None,
+            no_obfuscation,
+            no_obfuscation,
+            no_obfuscation_bytes,
+            no_obfuscation_bytes,
+        ),
+    ),
+    "pc66": (
+        "N60/PC-6001/mkII/6601",
+        FAT8_FIRST_METADATA_CLUSTER_PC66,
+        ("pc6001-8bit", decode_pc6001_8bit_charset, encode_pc6001_8bit_charset),
+        (
+            None,
+            no_obfuscation,
+            no_obfuscation,
+            no_obfuscation_bytes,
+            no_obfuscation_bytes,
+        ),
+    ),
+    "pc98": (
+        "PC98",
+        FAT8_FIRST_METADATA_CLUSTER_PC98,
+        ("pc98-8bit", decode_pc98_8bit_charset, encode_pc98_8bit_charset),
+        (
+            "pc98",
+            deobfuscate_byte_pc98,
+            obfuscate_byte_pc98,
+            deobfuscate_bytes_pc98,
+            obfuscate_bytes_pc98,
+        ),
+    ),
+    "pc88": (
+        "N80/PC88",
+        FAT8_FIRST_METADATA_CLUSTER_PC88,
+        ("pc98-8bit", decode_pc98_8bit_charset, encode_pc98_8bit_charset),
+        (
+            "pc88",
+            deobfuscate_byte_pc88,
+            obfuscate_byte_pc88,
+            deobfuscate_bytes_pc88,
+            obfuscate_bytes_pc88,
+        ),
+    ),
+}
+
+
 def guess_fat8_format_heuristics(*, track_and_sector_info: TrackAndSectorInfo):
     boot_sector = None
     for sector_info in track_and_sector_info.track_sector_map.get(
         make_track_and_side(track=0, side=0), []
     ):
         if sector_info.sec_num == 1:
-            boot_sector = sector_info.sector_data
-    is_pc66sr_rxr = boot_sector is not None and (
-        boot_sector.startswith(b"RXR") or boot_sector.startswith(b"IPL")
+            boot_sector = get_sector_data(
+                sector_info, track_and_sector_info=track_and_sector_info
+            )
+    is_pc66sr_rxr = boot_sector is not None and boot_sector.startswith(
+        (b"RXR", b"IPL")
     )
     is_pc66_sys = boot_sector is not None and boot_sector.startswith(b"SYS")
     is_pc98_sys = boot_sector is not None and len(boot_sector) == 128
@@ -1400,7 +1687,7 @@ def guess_fat8_format_heuristics(*, track_and_sector_info: TrackAndSectorInfo):
         if track_and_side.track in (0, 1)
     )
     fat8_sector_size = max(
-        max(len(sector_info.sector_data) for sector_info in sectors)
+        max(sector_info.sector_data_size for sector_info in sectors)
         for track_and_side, sectors in track_and_sector_info.track_sector_map.items()
         if track_and_side.track in (0, 1) and track_and_side.side == 0
     )
@@ -1410,33 +1697,42 @@ def guess_fat8_format_heuristics(*, track_and_sector_info: TrackAndSectorInfo):
         fat8_sector_size >>= 1
         fat8_sectors_per_track <<= 1
 
-    fat8_first_metadata_cluster = (
-        FAT8_FIRST_METADATA_CLUSTER_PC66SR
+    variant = (
+        "pc66sr"
         if is_pc66sr_rxr
         else (
-            FAT8_FIRST_METADATA_CLUSTER_PC66
+            "pc66"
             if is_pc66_sys or fat8_sides == 1
-            else (
-                FAT8_FIRST_METADATA_CLUSTER_PC98
-                if is_pc98_sys
-                else FAT8_FIRST_METADATA_CLUSTER_PC88
-            )
+            else "pc98" if is_pc98_sys else "pc88"
         )
     )
-    fat8_8bit_charset, decode_8bit_charset, encode_8bit_charset = (
-        ("pc6001-8bit", decode_pc6001_8bit_charset, encode_pc6001_8bit_charset)
-        if is_pc66_sys or is_pc66sr_rxr or fat8_sides == 1
-        else ("pc98-8bit", decode_pc98_8bit_charset, encode_pc98_8bit_charset)
-    )
-    fat8_obfuscation, deobfuscate_byte, obfuscate_byte = (
-        (None, no_obfuscation, no_obfuscation)
-        if side_is_cluster_lsb or is_pc66_sys or is_pc66sr_rxr or fat8_sides == 1
-        else (
-            ("pc98", deobfuscate_byte_pc98, obfuscate_byte_pc98)
-            if is_pc98_sys
-            else ("pc88", deobfuscate_byte_pc88, obfuscate_byte_pc88)
+    (
+        variant_name,
+        fat8_first_metadata_cluster,
+        (fat8_8bit_charset, decode_8bit_charset, encode_8bit_charset),
+        (
+            fat8_obfuscation,
+            deobfuscate_byte,
+            obfuscate_byte,
+            deobfuscate_bytes,
+            obfuscate_bytes,
+        ),
+    ) = FAT8_HEURISTIC_VARIANTS[variant]
+    if side_is_cluster_lsb:
+        variant_name = "Pasopia"
+        (
+            fat8_obfuscation,
+            deobfuscate_byte,
+            obfuscate_byte,
+            deobfuscate_bytes,
+            obfuscate_bytes,
+        ) = (
+            None,
+            no_obfuscation,
+            no_obfuscation,
+            no_obfuscation_bytes,
+            no_obfuscation_bytes,
         )
-    )
     fat8_disk_size = (
         track_and_sector_info.found_tracks
         * fat8_sides
@@ -1462,7 +1758,7 @@ def guess_fat8_format_heuristics(*, track_and_sector_info: TrackAndSectorInfo):
     )
     metadata_side = fat8_first_metadata_cluster // fat8_clusters_per_track % fat8_sides
 
-    fat8_format_name = f'Unknown format [{"Pasopia" if side_is_cluster_lsb else "PC-6001 mkII SR/6601 SR" if is_pc66sr_rxr else "N60/PC-6001/mkII/6601" if (is_pc66_sys or fat8_sides == 1) else "PC98" if is_pc98_sys else "N80/PC88"}-like {fat8_sides}-sided {track_and_sector_info.found_tracks}-track {fat8_sectors_per_track}-sectored (physical {track_and_sector_info.found_sectors}-sectored) with {len(boot_sector) if boot_sector is not None else "???"}-byte boot sector beginning with {repr(boot_sector[:4]) if boot_sector is not None else None} (largest physical sector is {track_and_sector_info.largest_sector_size} bytes) with metadata in track {metadata_track} on side {metadata_side} and {fat8_clusters_per_track} clusters per track]'
+    fat8_format_name = f'Unknown format [{variant_name}-like {fat8_sides}-sided {track_and_sector_info.found_tracks}-track {fat8_sectors_per_track}-sectored (physical {track_and_sector_info.found_sectors}-sectored) with {len(boot_sector) if boot_sector is not None else "???"}-byte boot sector beginning with {repr(boot_sector[:4]) if boot_sector is not None else None} (largest physical sector is {track_and_sector_info.largest_sector_size} bytes) with metadata in track {metadata_track} on side {metadata_side} and {fat8_clusters_per_track} clusters per track]'
     return make_fat8_info(
         boot_sector=boot_sector,
         is_pc66sr_rxr=is_pc66sr_rxr,
@@ -1480,6 +1776,8 @@ def guess_fat8_format_heuristics(*, track_and_sector_info: TrackAndSectorInfo):
         fat8_obfuscation=fat8_obfuscation,
         deobfuscate_byte=deobfuscate_byte,
         obfuscate_byte=obfuscate_byte,
+        deobfuscate_bytes=deobfuscate_bytes,
+        obfuscate_bytes=obfuscate_bytes,
         fat8_disk_size=fat8_disk_size,
         fat8_bytes_per_track=fat8_bytes_per_track,
         fat8_clusters_per_track=fat8_clusters_per_track,
@@ -1497,18 +1795,25 @@ def check_known_fat8_formats(
     *, track_and_sector_info: TrackAndSectorInfo, fat8_info: FAT8Info
 ):
     guessed_format, guessed_format_score = None, None
-    for known_format in KNOWN_FAT8_FORMATS:
-        if known_format.tracks != track_and_sector_info.found_tracks:
-            continue
-        if known_format.sides != fat8_info.fat8_sides:
-            continue
-        if known_format.sectors != fat8_info.fat8_sectors_per_track:
-            continue
-        known_format_score = sum(
-            1
-            for hint in known_format.sector1_start_hints
-            if fat8_info.boot_sector is not None and hint(fat8_info.boot_sector)
-        )
+    for known_format in KNOWN_FAT8_FORMATS_BY_GEOMETRY.get(
+        (
+            track_and_sector_info.found_tracks,
+            fat8_info.fat8_sides,
+            fat8_info.fat8_sectors_per_track,
+        ),
+        [],
+    ):
+        known_format_score = 0
+        if fat8_info.boot_sector is not None:
+            # the prefixes are mutually exclusive, so at most one can match
+            if fat8_info.boot_sector.startswith(known_format.sector1_start_prefixes):
+                known_format_score += 1
+            if (
+                known_format.sector1_size_is_128 is not None
+                and known_format.sector1_size_is_128
+                == (len(fat8_info.boot_sector) == 128)
+            ):
+                known_format_score += 1
         if guessed_format_score is None or known_format_score > guessed_format_score:
             guessed_format, guessed_format_score = known_format, known_format_score
     if guessed_format is None:
@@ -1521,14 +1826,26 @@ def check_known_fat8_formats(
         "pc98-8bit": (decode_pc98_8bit_charset, encode_pc98_8bit_charset),
     }[guessed_format.charset]
     if guessed_format.obfuscation is not None:
-        deobfuscate_byte, obfuscate_byte = {
-            "pc98": (deobfuscate_byte_pc98, obfuscate_byte_pc98),
-            "pc88": (deobfuscate_byte_pc88, obfuscate_byte_pc88),
+        deobfuscate_byte, obfuscate_byte, deobfuscate_bytes, obfuscate_bytes = {
+            "pc98": (
+                deobfuscate_byte_pc98,
+                obfuscate_byte_pc98,
+                deobfuscate_bytes_pc98,
+                obfuscate_bytes_pc98,
+            ),
+            "pc88": (
+                deobfuscate_byte_pc88,
+                obfuscate_byte_pc88,
+                deobfuscate_bytes_pc88,
+                obfuscate_bytes_pc88,
+            ),
         }[guessed_format.obfuscation]
     else:
-        deobfuscate_byte, obfuscate_byte = (
+        deobfuscate_byte, obfuscate_byte, deobfuscate_bytes, obfuscate_bytes = (
             no_obfuscation,
             no_obfuscation,
+            no_obfuscation_bytes,
+            no_obfuscation_bytes,
         )
     fat8_sectors_per_cluster = (
         fat8_info.fat8_sectors_per_track // guessed_format.clusters_per_track
@@ -1558,6 +1875,8 @@ def check_known_fat8_formats(
         fat8_obfuscation=guessed_format.obfuscation,
         deobfuscate_byte=deobfuscate_byte,
         obfuscate_byte=obfuscate_byte,
+        deobfuscate_bytes=deobfuscate_bytes,
+        obfuscate_bytes=obfuscate_bytes,
         metadata_track=guessed_format.metadata_track,
         metadata_side=guessed_format.metadata_side,
         fat8_clusters_per_track=guessed_format.clusters_per_track,
@@ -1597,42 +1916,27 @@ def analyze_fat8_format(*, track_and_sector_info: TrackAndSectorInfo):
     }
     autorun_sector_index = fat8_info.fat8_sectors_per_track - 3
     dir_sector_indices = set(range(1, autorun_sector_index))
-    metadata_cluster_indices = (
-        set(
+    # loop-invariant geometry, read from fat8_info once
+    clusters_per_track, sides = fat8_info.fat8_clusters_per_track, fat8_info.fat8_sides
+    metadata_track, metadata_side = fat8_info.metadata_track, fat8_info.metadata_side
+    if fat8_info.side_is_cluster_lsb:
+        metadata_cluster_indices = set(
             range(
-                fat8_info.metadata_track
-                * fat8_info.fat8_clusters_per_track
-                * fat8_info.fat8_sides
-                + fat8_info.metadata_side,
-                (1 + fat8_info.metadata_track)
-                * fat8_info.fat8_clusters_per_track
-                * fat8_info.fat8_sides
-                + fat8_info.metadata_side,
-                fat8_info.fat8_sides,
+                metadata_track * clusters_per_track * sides + metadata_side,
+                (1 + metadata_track) * clusters_per_track * sides + metadata_side,
+                sides,
             )
         )
-        if fat8_info.side_is_cluster_lsb
-        else set(
-            range(
-                (
-                    fat8_info.metadata_track * fat8_info.fat8_sides
-                    + fat8_info.metadata_side
-                )
-                * fat8_info.fat8_clusters_per_track,
-                (
-                    1
-                    + (
-                        fat8_info.metadata_track * fat8_info.fat8_sides
-                        + fat8_info.metadata_side
-                    )
-                )
-                * fat8_info.fat8_clusters_per_track,
-            )
+    else:
+        first_metadata_cluster = (
+            metadata_track * sides + metadata_side
+        ) * clusters_per_track
+        metadata_cluster_indices = set(
+            range(first_metadata_cluster, first_metadata_cluster + clusters_per_track)
         )
-    )
     assert (
-        fat8_info.fat8_first_metadata_cluster == sorted(metadata_cluster_indices)[0]
-    ), f"{fat8_info.fat8_first_metadata_cluster} != {sorted(metadata_cluster_indices)[0]}"
+        fat8_info.fat8_first_metadata_cluster == min(metadata_cluster_indices)
+    ), f"{fat8_info.fat8_first_metadata_cluster} != {min(metadata_cluster_indices)}"
     return fat8_info, make_metadata_indices(
         fat_sector_indices=fat_sector_indices,
         autorun_sector_index=autorun_sector_index,
@@ -1688,13 +1992,13 @@ def log_format_diagnostics(
     logger.append(f"Metadata track: {fat8_info.metadata_track}")
     logger.append(f"Metadata side: {fat8_info.metadata_side}")
     logger.append(
-        f"Directory virtual sector indices: {', '.join(f'{idx}' for idx in sorted(tuple(metadata_indices.dir_sector_indices)))}"
+        f"Directory virtual sector indices: {', '.join(f'{idx}' for idx in sorted(metadata_indices.dir_sector_indices))}"
     )
     logger.append(
         f"Autorun data virtual sector index: {metadata_indices.autorun_sector_index}"
     )
     logger.append(
-        f"FAT virtual sector indices: {', '.join(f'{idx}' for idx in sorted(tuple(metadata_indices.fat_sector_indices)))}"
+        f"FAT virtual sector indices: {', '.join(f'{idx}' for idx in sorted(metadata_indices.fat_sector_indices))}"
     )
 
 
@@ -1717,6 +2021,7 @@ UNLISTED_ENTRY_ATTRS = {
     PSEUDO_ATTR_UNUSED,
     PSEUDO_ATTR_DELETED,
 }
+NOT_ASCII_ENTRY_ATTRS = {ATTR_NON_ASCII, ATTR_BINARY}
 ALL_ATTRS = {
     0x001: ATTR_BINARY,
     0x002: ATTR_1_RESERVED,
@@ -1729,6 +2034,17 @@ ALL_ATTRS = {
     0x100: PSEUDO_ATTR_DELETED,
     0x200: PSEUDO_ATTR_UNUSED,
 }
+# attribute names for every combination of attribute bits, indexed by
+# the attribute mask; kept in ALL_ATTRS order so that sets built from
+# them come out the same as when built from ALL_ATTRS directly
+ATTRS_BY_MASK = tuple(
+    tuple(attr for mask, attr in ALL_ATTRS.items() if attr_mask & mask)
+    for attr_mask in range(0x400)
+)
+
+# a directory entry is a 6-byte name, a 3-byte extension, the attribute
+# byte, the first cluster, and 5 unused bytes
+DIRECTORY_ENTRY = struct.Struct("<6s3sBB5x")
 
 # these restrictions on generated filenames are somewhat conservative
 # and meant to accomodate MS-DOS, UNIX, macOS, and Windows - however
@@ -1751,72 +2067,82 @@ HOST_FS_UNSAFE_NAMES_UPPER = (
 )
 HOST_FS_UNSAFE_START_CHARS = {" "}
 HOST_FS_UNSAFE_END_CHARS = set(" .")
+# everything quoted regardless of position: unsafe characters, the
+# private use area, and % since we use it for quoting
+HOST_FS_QUOTED_CHARS = frozenset(
+    HOST_FS_UNSAFE_CHARS | {"%"} | set(chr(i) for i in range(0xE000, 0xF900))
+)
+
+# attribute-derived suffixes for generated filenames, in the order they
+# are added: (attribute, suffix, natural suffixes that make the suffix
+# redundant). the None attribute stands for plain ASCII files, i.e.
+# neither Non-ASCII nor Binary.
+HOST_FS_ATTR_SUFFIXES = (
+    (PSEUDO_ATTR_UNUSED, "---", ()),
+    (ATTR_READ_AFTER_WRITE, "vfy", ()),
+    (ATTR_1_RESERVED, "r-1", ()),
+    (ATTR_2_RESERVED, "r-2", ()),
+    (ATTR_3_RESERVED, "r-3", ()),
+    (ATTR_READ_ONLY, "r-o", ()),
+    (ATTR_NON_ASCII, "bas", ("bas", "n88", "nip", "hd")),
+    (ATTR_BINARY, "bin", ("bin", "cod")),
+    (None, "asc", ("asc", "txt")),
+    (PSEUDO_ATTR_DELETED, "era", ()),
+    (ATTR_OBFUSCATED, "obf", ()),
+)
 
 
-def to_host_fs_name(name, ext, fattrs, *, fat8_info: FAT8Info):
-    filename = f"{name.rstrip(' ')}{'.' if ext.rstrip(' ') else ''}{ext.rstrip(' ')}"
+# directory entries are named twice (plain and deobfuscated), and the
+# quoted name does not depend on the attributes, so it is cached
+@functools.lru_cache(maxsize=4096)
+def host_fs_base_name(name, ext, *, encode_8bit_charset):
+    name, ext = name.rstrip(" "), ext.rstrip(" ")
+    filename = f"{name}{'.' if ext else ''}{ext}"
     filename_chars = [ch for ch in filename]
+    # loop invariants
+    is_unsafe_name = filename.upper() in HOST_FS_UNSAFE_NAMES_UPPER
+    is_all_dots = filename == "." * len(filename)
+    last_i = len(filename_chars) - 1
     for i, ch in enumerate(filename_chars):
-        unsafe = ch in HOST_FS_UNSAFE_CHARS
         if (
-            filename.upper() in HOST_FS_UNSAFE_NAMES_UPPER
-            or filename == "." * len(filename)
-            and i == 0
+            ch in HOST_FS_QUOTED_CHARS
+            or is_unsafe_name
+            or ch == "." and i != len(name)
+            or i == 0 and (is_all_dots or ch in HOST_FS_UNSAFE_START_CHARS)
+            or i == last_i and ch in HOST_FS_UNSAFE_END_CHARS
         ):
-            unsafe = True
-        if ch == "." and i != len(name.rstrip(" ")):
-            unsafe = True
-        if i == 0 and ch in HOST_FS_UNSAFE_START_CHARS:
-            unsafe = True
-        if i == len(filename_chars) - 1 and ch in HOST_FS_UNSAFE_END_CHARS:
-            unsafe = True
-        if ch >= "\ue000" and ch <= "\uf8ff":
-            unsafe = True
-        if unsafe or ch == "%":  # quote % too since we use it for quoting
             filename_chars[i] = "".join(
-                f"%{byt:02X}" for byt in fat8_info.encode_8bit_charset(filename[i])
+                f"%{byt:02X}" for byt in encode_8bit_charset(filename[i])
             )
     host_fs_name = "".join(filename_chars)
     if not host_fs_name or host_fs_name[:1] == ".":
         host_fs_name = "(empty)" + host_fs_name
+    return host_fs_name
+
+
+def host_fs_attr_suffix(host_fs_name, fattrs):
     natural_suffix = "".join(host_fs_name.split(".")[1:]).lower()
+    is_ascii = NOT_ASCII_ENTRY_ATTRS.isdisjoint(fattrs)
     host_fs_suffix = ".." + ".".join(
-        sum(
-            [
-                ["---"] if PSEUDO_ATTR_UNUSED in fattrs else [],
-                ["vfy"] if ATTR_READ_AFTER_WRITE in fattrs else [],
-                ["r-1"] if ATTR_1_RESERVED in fattrs else [],
-                ["r-2"] if ATTR_2_RESERVED in fattrs else [],
-                ["r-3"] if ATTR_3_RESERVED in fattrs else [],
-                ["r-o"] if ATTR_READ_ONLY in fattrs else [],
-                (
-                    ["bas"]
-                    if ATTR_NON_ASCII in fattrs
-                    and natural_suffix not in ("bas", "n88", "nip", "hd")
-                    else []
-                ),
-                (
-                    ["bin"]
-                    if ATTR_BINARY in fattrs and natural_suffix not in ("bin", "cod")
-                    else []
-                ),
-                (
-                    ["asc"]
-                    if not {ATTR_NON_ASCII, ATTR_BINARY}.intersection(fattrs)
-                    and natural_suffix not in ("asc", "txt")
-                    else []
-                ),
-                ["era"] if PSEUDO_ATTR_DELETED in fattrs else [],
-                ["obf"] if ATTR_OBFUSCATED in fattrs else [],
-            ],
-            [],
-        )
+        [
+            suffix
+            for attr, suffix, natural_suffixes in HOST_FS_ATTR_SUFFIXES
+            if (attr in fattrs if attr is not None else is_ascii)
+            and natural_suffix not in natural_suffixes
+        ]
     )
     if host_fs_suffix == "..":
         host_fs_suffix = ""
     if "." in host_fs_name:
         host_fs_suffix = host_fs_suffix[len(".") :]
-    return host_fs_name + host_fs_suffix
+    return host_fs_suffix
+
+
+def to_host_fs_name(name, ext, fattrs, *, fat8_info: FAT8Info):
+    host_fs_name = host_fs_base_name(
+        name, ext, encode_8bit_charset=fat8_info.encode_8bit_charset
+    )
+    return host_fs_name + host_fs_attr_suffix(host_fs_name, fattrs)
 
 
 def extend_name(base_filename, name_tail):
@@ -1828,6 +2154,25 @@ def extend_name(base_filename, name_tail):
     return ".".join(parts)
 
 
+def disambiguate_name(host_fs_name, *, used_lower_fs_names, next_disambig_nums):
+    """Add " (2)", " (3)", etc. to a filename as needed to avoid
+    case-insensitive collisions with used_lower_fs_names.
+    """
+    # used_lower_fs_names only ever grows, so numbers found to be in
+    # use for a name stay in use and need not be probed again
+    lower_name = host_fs_name.lower()
+    disambig_num = next_disambig_nums.get(lower_name, 1)
+    while (
+        extend_name(lower_name, f" ({disambig_num})" if disambig_num > 1 else "")
+        in used_lower_fs_names
+    ):
+        disambig_num += 1
+    next_disambig_nums[lower_name] = disambig_num
+    return extend_name(
+        host_fs_name, f" ({disambig_num})" if disambig_num > 1 else ""
+    )
+
+
 class DirectoryEntry(NamedTuple):
     idx: int
     host_fs_name: str
@@ -1879,8 +2224,11 @@ def analyze_metadata_track(
     raw_metadata_sectors = {}
     used_filenames: Dict[str, DirectoryEntry] = {}
     used_lower_fs_names = set()
+    next_disambig_nums: Dict[str, int] = {}
     end_of_directory = False
-    for sec_num, offset, data, sectors_in_track in sorted(metadata_sectors):
+    for sector_info in sorted(metadata_sectors):
+        sec_num = sector_info.sec_num
+        data = get_sector_data(sector_info, track_and_sector_info=track_and_sector_info)
         for vsec_num in range(
             ((sec_num - 1) << fat8_info.fat8_sector_shift) + 1,
             (sec_num << fat8_info.fat8_sector_shift) + 1,
@@ -1894,48 +2242,48 @@ def analyze_metadata_track(
             ]
             raw_metadata_sectors[vsec_num] = vdata
             if vsec_num in metadata_indices.dir_sector_indices and not end_of_directory:
-                for i in range(0, 256, 16):
-                    entry = vdata[i : i + 16]
-                    raw_name = entry[0:6]
-                    name = fat8_info.decode_8bit_charset(raw_name, preserve=NO_CONTROLS)
-                    raw_ext = entry[6:9]
-                    ext = fat8_info.decode_8bit_charset(raw_ext, preserve=NO_CONTROLS)
-                    # two pseudo-attributes are encoded using special characters in the first byte of the filename
-                    attr_mask = (
-                        entry[9]
-                        | (0x100 if entry[0] == 0x00 else 0x000)
-                        | (0x200 if entry[0] == 0xFF else 0x000)
+                for i, (raw_name, raw_ext, attr_byte, cluster) in enumerate(
+                    DIRECTORY_ENTRY.iter_unpack(vdata)
+                ):
+                    if raw_name[0] == 0xFF:
+                        # directory listing terminates at the first unused
+                        # entry; stop before decoding or naming it
+                        end_of_directory = True
+                        break
+                    entry = vdata[i * 16 : (i + 1) * 16]
+                    name = decode_8bit_metadata(
+                        raw_name, NO_CONTROLS, fat8_info=fat8_info
                     )
-                    fattrs = set(
-                        attr for mask, attr in ALL_ATTRS.items() if attr_mask & mask
+                    ext = decode_8bit_metadata(
+                        raw_ext, NO_CONTROLS, fat8_info=fat8_info
                     )
-                    cluster = entry[10]
-                    host_fs_name = to_host_fs_name(
-                        name, ext, fattrs, fat8_info=fat8_info
+                    # two pseudo-attributes are encoded using special characters in the first byte of the filename
+                    attr_mask = (
+                        attr_byte
+                        | (0x100 if raw_name[0] == 0x00 else 0x000)
+                        | (0x200 if raw_name[0] == 0xFF else 0x000)
                     )
-                    disambig = ""
-                    while (
-                        extend_name(host_fs_name.lower(), disambig)
-                        in used_lower_fs_names
-                    ):
-                        disambig = f" ({1 + int(disambig.strip(' ()') or 1)})"
-                    host_fs_name = extend_name(host_fs_name, disambig)
-                    host_fs_deobf_name = to_host_fs_name(
-                        name, ext, fattrs - {ATTR_OBFUSCATED}, fat8_info=fat8_info
+                    fattrs = set(ATTRS_BY_MASK[attr_mask])
+                    host_fs_name = disambiguate_name(
+                        to_host_fs_name(name, ext, fattrs, fat8_info=fat8_info),
+                        used_lower_fs_names=used_lower_fs_names,
+                        next_disambig_nums=next_disambig_nums,
                     )
-                    disambig_deobf = ""
-                    while (
-                        extend_name(host_fs_deobf_name.lower(), disambig_deobf)
-                        in used_lower_fs_names
-                    ):
-                        disambig_deobf = (
-                            f" ({1 + int(disambig_deobf.strip(' ()') or 1)})"
+                    # without the obfuscated attribute both names come out the same
+                    host_fs_deobf_name = (
+                        disambiguate_name(
+                            to_host_fs_name(
+                                name,
+                                ext,
+                                fattrs - {ATTR_OBFUSCATED},
+                                fat8_info=fat8_info,
+                            ),
+                            used_lower_fs_names=used_lower_fs_names,
+                            next_disambig_nums=next_disambig_nums,
                         )
-                    host_fs_deobf_name = extend_name(host_fs_deobf_name, disambig_deobf)
-                    if PSEUDO_ATTR_UNUSED in fattrs:
-                        # directory listing terminates at the first unused entry
-                        end_of_directory = True
-                        break
+                        if ATTR_OBFUSCATED in fattrs
+                        else host_fs_name
+                    )
                     used_lower_fs_names.update({host_fs_name.lower()})
                     if (
                         ATTR_OBFUSCATED in fattrs
@@ -1943,7 +2291,7 @@ def analyze_metadata_track(
                     ):
                         used_lower_fs_names.update({host_fs_deobf_name.lower()})
                     parsed_entry = make_directory_entry(
-                        idx=(vsec_num - 1) * 16 + i // 16 + 1,
+                        idx=(vsec_num - 1) * 16 + i + 1,
                         host_fs_name=host_fs_name,
                         host_fs_deobf_name=host_fs_deobf_name,
                         fattrs=fattrs,
@@ -1969,6 +2317,8 @@ def analyze_metadata_track(
                 fat_sectors[vsec_num] = vdata
             elif vsec_num == metadata_indices.autorun_sector_index:
                 autorun_data = vdata
+    # later passes walk the entries in directory order, so sort them just once here
+    directory_entries.sort(key=lambda ent: ent.idx)
     return make_metadata_track_info(
         directory_entries=directory_entries,
         fat_sectors=fat_sectors,
@@ -1979,67 +2329,78 @@ def analyze_metadata_track(
     )
 
 
+# display characters for the hexdump, keyed by (decoder, previous
+# byte, byte) since the previous byte matters for PC-6001 alternate
+# characters and voiced sound marks; most of the 65536 pairs never
+# occur, so these are filled in on first use
+HEXDUMP_DISPLAY_CHARS: Dict[tuple, str] = {}
+
+
+def hexdump_display_char(prev_byt, byt, *, decode_8bit_charset):
+    key = (decode_8bit_charset, prev_byt, byt)
+    ch = HEXDUMP_DISPLAY_CHARS.get(key)
+    if ch is None:
+        ch = decode_8bit_charset(bytes([prev_byt, byt]), preserve=NO_CONTROLS)[-1:]
+        if ch <= "\x1f" or ch == "\x7f" or ch >= "\ue000" and ch <= "\uf8ff":
+            ch = "."
+        HEXDUMP_DISPLAY_CHARS[key] = ch
+    return ch
+
+
+def hexdump_hex_columns(row_data):
+    """formats up to 16 bytes as two padded groups of 8 hex columns"""
+    hex_digits = row_data.hex(" ").upper()
+    return f" {hex_digits[:23]:23}  {hex_digits[24:]:23} "
+
+
+# right-hand border of a hexdump row, indexed by how many of its 16
+# bytes are missing (only ever nonzero on the last row)
+HEXDUMP_ROW_TAILS = ("│",) + tuple("╭" + "─" * (n - 1) + "╯" for n in range(1, 17))
+
+
 def hexdump_entry_data(file_data, fattrs, *, fat8_info: FAT8Info, logger: Logger):
+    # the deobfuscated columns are only shown for obfuscated files, so
+    # only then is the data deobfuscated (once, up front)
+    show_deobf = ATTR_OBFUSCATED in fattrs and fat8_info.fat8_obfuscation is not None
+    deobf_data = fat8_info.deobfuscate_bytes(file_data) if show_deobf else b""
+    # rows are collected and logged together, as a single multi-line entry
+    rows = []
     for i in range(0, len(file_data), 16):
-        row = f"{i:06X}: "
-        drow = " "
-        dvrow = vrow = "│"
-        vtail = dvtail = "│"
-        for j in range(i, i + 16):
-            row += f" {file_data[j]:02X}" if j < len(file_data) else "   "
-            drow += (
-                f" {fat8_info.deobfuscate_byte(j, file_data[j]):02X}"
-                if j < len(file_data)
-                else "   "
-            )
-            if j < len(file_data):
-                ch = fat8_info.decode_8bit_charset(
-                    bytes([file_data[j - 1] if j else 0, file_data[j]]),
-                    preserve=NO_CONTROLS,
-                )[-1:]
-                vrow += (
-                    "."
-                    if ch <= "\x1f" or ch == "\x7f" or ch >= "\ue000" and ch <= "\uf8ff"
-                    else ch
+        row = f"{i:06X}: " + hexdump_hex_columns(file_data[i : i + 16])
+        drow = " " + hexdump_hex_columns(deobf_data[i : i + 16]) if show_deobf else ""
+        vrow, dvrow = ["│"], ["│"]
+        vtail = HEXDUMP_ROW_TAILS[max(0, i + 16 - len(file_data))]
+        for j in range(i, min(i + 16, len(file_data))):
+            vrow.append(
+                hexdump_display_char(
+                    file_data[j - 1] if j else 0,
+                    file_data[j],
+                    decode_8bit_charset=fat8_info.decode_8bit_charset,
                 )
-                dch = fat8_info.decode_8bit_charset(
-                    bytes(
-                        [
-                            (
-                                fat8_info.deobfuscate_byte(j - 1, file_data[j - 1])
-                                if j
-                                else 0
-                            ),
-                            fat8_info.deobfuscate_byte(j, file_data[j]),
-                        ]
-                    ),
-                    preserve=NO_CONTROLS,
-                )[-1:]
-                dvrow += (
-                    "."
-                    if dch <= "\x1f"
-                    or dch == "\x7f"
-                    or dch >= "\ue000"
-                    and dch <= "\uf8ff"
-                    else dch
+            )
+            if show_deobf:
+                dvrow.append(
+                    hexdump_display_char(
+                        deobf_data[j - 1] if j else 0,
+                        deobf_data[j],
+                        decode_8bit_charset=fat8_info.decode_8bit_charset,
+                    )
                 )
-            else:
-                vtail = "╭" + "─" * len(vtail[:-1]) + "╯"
-                dvtail = "╭" + "─" * len(dvtail[:-1]) + "╯"
-            if j % 8 == 7:
-                row += " "
-                drow += " "
-        logger.append(
-            f"{row} {vrow}{vtail}"
+        rows.append(
+            f"{row} {''.join(vrow)}{vtail}"
             + (
-                f"{drow} {dvrow}{dvtail}"
-                if ATTR_OBFUSCATED in fattrs and fat8_info.fat8_obfuscation is not None
+                f"{drow} {''.join(dvrow)}{vtail}"
+                if show_deobf
                 else ""
             )
         )
-    logger.append(
-        f"{len(file_data):06X}{'':53}╰{'─' * ((len(file_data) % 16) or 16)}╯{'' if ATTR_OBFUSCATED not in fattrs or fat8_info.fat8_obfuscation is None else ' ' * ((16 - ((len(file_data) % 16) or 16)) + 52) + '╰' + '─' * ((len(file_data) % 16) or 16) + '╯'}"
+    last_row_len = (len(file_data) % 16) or 16
+    bottom_border = f"╰{'─' * last_row_len}╯"
+    rows.append(
+        f"{len(file_data):06X}{'':53}{bottom_border}"
+        + (f"{'':{16 - last_row_len + 52}}{bottom_border}" if show_deobf else "")
     )
+    logger.append("\n".join(rows))
 
 
 def log_boot_sector(*, fat8_info: FAT8Info, logger: Logger) -> int:
@@ -2067,7 +2428,7 @@ def log_raw_directory_sectors(
     for vsec_num in sorted(metadata_indices.dir_sector_indices):
         sector_data = metadata_track_info.raw_metadata_sectors.get(vsec_num)
         if sector_data is not None:
-            if sector_data == b"\xff" * len(sector_data):
+            if not sector_data.rstrip(b"\xff"):
                 logger.append(
                     f"\nDirectory Sector {vsec_num:2} unused: {len(sector_data)} 0xFF bytes"
                 )
@@ -2107,7 +2468,7 @@ def log_autorun_data(
             f"Number of files (0-15) ? {metadata_track_info.autorun_data[1] if metadata_track_info.autorun_data[1] != 0xFF else '(ask user)'}"
         )
         logger.append(
-            f"Payload: {fat8_info.decode_8bit_charset(metadata_track_info.autorun_data[2:].rstrip(bytes([0x00])).rstrip(b' '))}"
+            f"Payload: {decode_8bit_metadata(metadata_track_info.autorun_data[2:].rstrip(bytes([0x00])).rstrip(b' '), fat8_info=fat8_info)}"
         )
     else:
         logger.append(f"\n== No Autorun/ID Sector !!! ==")
@@ -2122,50 +2483,47 @@ def check_fat_sectors(
     metadata_track_info: MetadataTrackInfo,
     logger: Logger,
 ):
-    first_fat_sector_idx = (
-        sorted(metadata_track_info.fat_sectors.keys())[0]
-        if metadata_track_info.fat_sectors
-        else None
-    )
+    first_fat_sector_idx = min(metadata_track_info.fat_sectors, default=None)
     fat1 = None
     if first_fat_sector_idx is not None:
         fat1 = metadata_track_info.fat_sectors[first_fat_sector_idx]
         logger.append(f"\n== FAT Sector {first_fat_sector_idx:2} =={'':40}╭{'─' * 16}╮")
         hexdump_entry_data(fat1, set(), fat8_info=fat8_info, logger=logger)
         usable_fat = True
-        if fat1[FAT8_BOOT_SECTOR_CLUSTER] not in {
-            FAT8_CHAIN_TERMINAL_LINK,
-            FAT8_BOOT_SECTOR_CLUSTER,
-        } | set(range(fat8_info.fat8_total_clusters)) | set(
+        # the sets of acceptable cluster values are built once, not per cluster
+        data_cluster_values = frozenset(range(fat8_info.fat8_total_clusters))
+        final_cluster_values = frozenset(
             range(
                 FAT8_FINAL_CLUSTER_OFFSET,
                 FAT8_FINAL_CLUSTER_OFFSET + fat8_info.fat8_sectors_per_cluster + 1,
             )
-        ):
+        )
+        metadata_cluster_values = (
+            {FAT8_CHAIN_TERMINAL_LINK}
+            | metadata_indices.metadata_cluster_indices
+            | final_cluster_values
+        )
+        plausible_cluster_values = (
+            data_cluster_values
+            | final_cluster_values
+            | {FAT8_CHAIN_TERMINAL_LINK, FAT8_UNALLOCATED_CLUSTER}
+        )
+        if fat1[FAT8_BOOT_SECTOR_CLUSTER] not in {
+            FAT8_CHAIN_TERMINAL_LINK,
+            FAT8_BOOT_SECTOR_CLUSTER,
+        } | data_cluster_values | final_cluster_values:
             logger.append(
                 f"Unusable first FAT, it does not reserve cluster 0x{FAT8_BOOT_SECTOR_CLUSTER:02X} for boot sector"
             )
             usable_fat = False
         for cluster_idx in sorted(metadata_indices.metadata_cluster_indices):
-            if fat1[cluster_idx] not in {
-                FAT8_CHAIN_TERMINAL_LINK
-            } | metadata_indices.metadata_cluster_indices | set(
-                range(
-                    FAT8_FINAL_CLUSTER_OFFSET,
-                    FAT8_FINAL_CLUSTER_OFFSET + fat8_info.fat8_sectors_per_cluster + 1,
-                )
-            ):
+            if fat1[cluster_idx] not in metadata_cluster_values:
                 logger.append(
                     f"Unusable first FAT, it does not reserve cluster 0x{cluster_idx:02X} for metadata track"
                 )
                 usable_fat = False
         for i in range(0, fat8_info.fat8_total_clusters):
-            if fat1[i] not in set(range(fat8_info.fat8_total_clusters)) | set(
-                range(
-                    FAT8_FINAL_CLUSTER_OFFSET,
-                    FAT8_FINAL_CLUSTER_OFFSET + fat8_info.fat8_sectors_per_cluster + 1,
-                )
-            ) | {FAT8_CHAIN_TERMINAL_LINK, FAT8_UNALLOCATED_CLUSTER}:
+            if fat1[i] not in plausible_cluster_values:
                 logger.append(
                     f"Unusable first FAT, cluster 0x{i:02X} has value 0x{fat1[i]:02X}; should be one of {0:02X}..{fat8_info.fat8_total_clusters-1:02X}, {FAT8_FINAL_CLUSTER_OFFSET:02X}..{FAT8_FINAL_CLUSTER_OFFSET + fat8_info.fat8_sectors_per_cluster:02X}, {FAT8_CHAIN_TERMINAL_LINK:02X}, {FAT8_UNALLOCATED_CLUSTER:02X}"
                 )
@@ -2178,15 +2536,11 @@ def check_fat_sectors(
                 "First FAT is usable: boot sector and metadata track are marked as reserved and cluster values are plausible"
             )
             logger.append("\n== FAT Consistency Check ==")
-            matches = {
-                {
-                    fat1[i] == sector_data[i]
-                    for i in range(1, fat8_info.fat8_total_clusters)
-                }
-                == {True}
+            fat1_allocations = fat1[1 : fat8_info.fat8_total_clusters]
+            if all(
+                sector_data[1 : fat8_info.fat8_total_clusters] == fat1_allocations
                 for sector_data in metadata_track_info.fat_sectors.values()
-            }
-            if matches == {True}:
+            ):
                 logger.append("FAT copies have matching allocations")
             else:
                 logger.append("FAT copies DO NOT match")
@@ -2226,6 +2580,7 @@ def analyze_fat_chains(
             continue
         else:
             chain = [entry.cluster]
+            chain_links = {entry.cluster}
             if entry.cluster >= FAT8_FINAL_CLUSTER_OFFSET and entry.cluster not in (
                 FAT8_CHAIN_TERMINAL_LINK,
                 FAT8_UNALLOCATED_CLUSTER,
@@ -2241,10 +2596,11 @@ def analyze_fat_chains(
                 if next_link < FAT8_FINAL_CLUSTER_OFFSET:
                     if next_link >= fat8_info.fat8_total_clusters:
                         errors.update({"Chain entry falls outside of disk"})
-                    elif next_link in chain:
+                    elif next_link in chain_links:
                         errors.update({"Cycle in FAT chain"})
-                chain += [next_link]
-            if (FAT8_UNALLOCATED_CLUSTER in chain) and not errors:
+                chain.append(next_link)
+                chain_links.add(next_link)
+            if (FAT8_UNALLOCATED_CLUSTER in chain_links) and not errors:
                 errors.update({"Unallocated cluster in FAT chain"})
             if (
                 chain[-1] < FAT8_FINAL_CLUSTER_OFFSET
@@ -2285,19 +2641,10 @@ def analyze_fat_chains(
                 )
 
         metadata_track_info.directory_entries[offset_in_directory_entries] = (
-            make_directory_entry(
-                idx=entry.idx,
-                host_fs_name=entry.host_fs_name,
-                host_fs_deobf_name=entry.host_fs_deobf_name,
-                fattrs=entry.fattrs,
-                cluster=entry.cluster,
-                name=entry.name,
-                ext=entry.ext,
+            entry._replace(
                 chain=chain,
                 errors=entry.errors | errors,
                 allocated_size=allocated_size,
-                raw_entry=entry.raw_entry,
-                file_data=entry.file_data,
             )
         )
     return error_count
@@ -2310,6 +2657,63 @@ def quote_filename(filename):
     return filename
 
 
+def map_virtual_sectors(
+    sectors: List[SectorInfo],
+    *,
+    track_and_sector_info: TrackAndSectorInfo,
+    fat8_info: FAT8Info,
+):
+    """maps each virtual sector number in a track to its physical sector and data"""
+    virtual_sectors = {}
+    for sector_info in sectors:
+        sector_data = get_sector_data(
+            sector_info, track_and_sector_info=track_and_sector_info
+        )
+        for vsec_num in range(
+            ((sector_info.sec_num - 1) << fat8_info.fat8_sector_shift) + 1,
+            (sector_info.sec_num << fat8_info.fat8_sector_shift) + 1,
+        ):
+            vsec_offset = fat8_info.fat8_sector_size * (
+                (vsec_num - 1) % (1 << fat8_info.fat8_sector_shift)
+            )
+            virtual_sectors.setdefault(
+                vsec_num,
+                (
+                    sector_info,
+                    sector_data[vsec_offset : vsec_offset + fat8_info.fat8_sector_size],
+                ),
+            )
+    return virtual_sectors
+
+
+def locate_clusters(*, fat8_info: FAT8Info):
+    """maps each cluster number to its track and side and first virtual sector number"""
+    sectors_per_cluster = (
+        fat8_info.fat8_sectors_per_track // fat8_info.fat8_clusters_per_track
+    )
+    cluster_locations = []
+    for cluster in range(fat8_info.fat8_total_clusters):
+        if fat8_info.side_is_cluster_lsb:
+            cluster_on_side, cluster_side = divmod(cluster, fat8_info.fat8_sides)
+            cluster_track, cluster_in_track = divmod(
+                cluster_on_side, fat8_info.fat8_clusters_per_track
+            )
+        else:
+            track_and_side_num, cluster_in_track = divmod(
+                cluster, fat8_info.fat8_clusters_per_track
+            )
+            cluster_track, cluster_side = divmod(
+                track_and_side_num, fat8_info.fat8_sides
+            )
+        cluster_locations.append(
+            (
+                make_track_and_side(track=cluster_track, side=cluster_side),
+                1 + cluster_in_track * sectors_per_cluster,
+            )
+        )
+    return cluster_locations
+
+
 def reconstruct_file_data(
     *,
     track_and_sector_info: TrackAndSectorInfo,
@@ -2319,18 +2723,18 @@ def reconstruct_file_data(
 ) -> int:
     """reconstructs file data while analyzing FAT chains"""
     error_count = 0
-    for idx, entry, offset_in_directory_entries in sorted(
-        (ent.idx, ent, offset_in_directory_entries)
-        for offset_in_directory_entries, ent in enumerate(
-            metadata_track_info.directory_entries
-        )
+    cluster_locations = locate_clusters(fat8_info=fat8_info)
+    # virtual sectors by track and side, filled in as clusters are visited
+    track_virtual_sectors = {}
+    for offset_in_directory_entries, entry in enumerate(
+        metadata_track_info.directory_entries
     ):
         if PSEUDO_ATTR_DELETED in entry.fattrs:
             continue
         elif PSEUDO_ATTR_UNUSED in entry.fattrs:
             continue
         chain = entry.chain
-        unlisted = True if UNLISTED_ENTRY_ATTRS.intersection(entry.fattrs) else False
+        unlisted = not UNLISTED_ENTRY_ATTRS.isdisjoint(entry.fattrs)
         if not entry.errors:
             sep = (
                 "*"
@@ -2340,10 +2744,9 @@ def reconstruct_file_data(
             logger.append(
                 f"{entry.idx:3}. {'[' if unlisted else ' '}{entry.name}{sep}{entry.ext}{']' if unlisted else ' '} {(entry.allocated_size + fat8_info.fat8_bytes_per_cluster - 1) // fat8_info.fat8_bytes_per_cluster:3d} {quote_filename(entry.host_fs_name)+('' if ATTR_OBFUSCATED not in entry.fattrs or fat8_info.fat8_obfuscation is None else ', ' + quote_filename(entry.host_fs_deobf_name)):40} {'':8} ATTRS={entry.fattrs or None}  START={entry.cluster:02X} CHAIN={'→'.join(f'{cluster:02X}' for cluster in entry.chain) if entry.chain else None} STATUS={entry.errors or 'OK'}"
             )
-            file_data: Optional[bytes] = b""
-            final_cluster_offset = 0
+            file_data_chunks: Optional[List[bytes]] = []
             for i, cluster in enumerate(chain[:-1]):
-                if file_data is None:
+                if file_data_chunks is None:
                     # due to a previous error
                     logger.append(
                         f"Chain {entry.cluster:02X} Cluster {cluster:02X}: Skipped due to preceding error"
@@ -2352,7 +2755,6 @@ def reconstruct_file_data(
                 in_final_cluster = i == len(chain) - 2
                 max_fat8_sectors_in_cluster = fat8_info.fat8_sectors_per_cluster
                 if in_final_cluster:
-                    final_cluster_offset = len(file_data)
                     if (
                         chain[-1] >= FAT8_FINAL_CLUSTER_OFFSET
                         and chain[-1] < FAT8_CHAIN_TERMINAL_LINK
@@ -2360,43 +2762,18 @@ def reconstruct_file_data(
                         max_fat8_sectors_in_cluster = (
                             chain[-1] - FAT8_FINAL_CLUSTER_OFFSET
                         )
-                if fat8_info.side_is_cluster_lsb:
-                    cluster_track = (
-                        cluster
-                        // fat8_info.fat8_sides
-                        // fat8_info.fat8_clusters_per_track
-                    )
-                    cluster_side = cluster % fat8_info.fat8_sides
-                    first_cluster_sec_num = 1 + (
-                        cluster
-                        // fat8_info.fat8_sides
-                        % fat8_info.fat8_clusters_per_track
-                    ) * (
-                        fat8_info.fat8_sectors_per_track
-                        // fat8_info.fat8_clusters_per_track
-                    )
-                else:
-                    cluster_track = (
-                        cluster
-                        // fat8_info.fat8_clusters_per_track
-                        // fat8_info.fat8_sides
-                    )
-                    cluster_side = (
-                        cluster
-                        // fat8_info.fat8_clusters_per_track
-                        % fat8_info.fat8_sides
-                    )
-                    first_cluster_sec_num = 1 + (
-                        cluster % fat8_info.fat8_clusters_per_track
-                    ) * (
-                        fat8_info.fat8_sectors_per_track
-                        // fat8_info.fat8_clusters_per_track
-                    )
-                cluster_sectors: List[SectorInfo] = (
-                    track_and_sector_info.track_sector_map.get(
-                        make_track_and_side(track=cluster_track, side=cluster_side), []
+                cluster_track_and_side, first_cluster_sec_num = cluster_locations[
+                    cluster
+                ]
+                if cluster_track_and_side not in track_virtual_sectors:
+                    track_virtual_sectors[cluster_track_and_side] = map_virtual_sectors(
+                        track_and_sector_info.track_sector_map.get(
+                            cluster_track_and_side, []
+                        ),
+                        track_and_sector_info=track_and_sector_info,
+                        fat8_info=fat8_info,
                     )
-                )
+                virtual_sectors = track_virtual_sectors[cluster_track_and_side]
                 cluster_sector_list = []
                 for cluster_sec_num in range(
                     first_cluster_sec_num,
@@ -2407,165 +2784,164 @@ def reconstruct_file_data(
                         cluster_sec_num
                         == first_cluster_sec_num + max_fat8_sectors_in_cluster - 1
                     )
-                    if file_data is None:
+                    if file_data_chunks is None:
                         # due to a previous error
                         break
-                    for (
-                        sec_num,
-                        actual_data_offset,
-                        sector_data,
-                        sectors_in_track,
-                    ) in cluster_sectors:
-                        for vsec_num in range(
-                            ((sec_num - 1) << fat8_info.fat8_sector_shift) + 1,
-                            (sec_num << fat8_info.fat8_sector_shift) + 1,
-                        ):
-                            if vsec_num == cluster_sec_num:
-                                vsector_data = sector_data[
-                                    fat8_info.fat8_sector_size
-                                    * (
-                                        (vsec_num - 1)
-                                        % (1 << fat8_info.fat8_sector_shift)
-                                    ) : fat8_info.fat8_sector_size
-                                    * (
-                                        1
-                                        + (
-                                            (vsec_num - 1)
-                                            % (1 << fat8_info.fat8_sector_shift)
-                                        )
-                                    )
-                                ]
-                                cluster_sector_data = vsector_data
-                                if (
-                                    in_final_cluster
-                                    and in_final_sector
-                                    and cluster_sector_data.rstrip(b"\0")[-1:]
-                                    == b"\x1a"
-                                ):
-                                    cluster_sector_data = cluster_sector_data.rstrip(
-                                        b"\0"
-                                    )[:-1]
-                                cluster_sector_list += [
-                                    (
-                                        sec_num,
-                                        actual_data_offset,
-                                        sector_data,
-                                        sectors_in_track,
-                                        vsec_num,
-                                        cluster_sector_data,
-                                    )
-                                ]
-                                break
-                        if cluster_sector_data is not None:
-                            break
+                    virtual_sector = virtual_sectors.get(cluster_sec_num)
+                    if virtual_sector is not None:
+                        sector_info, cluster_sector_data = virtual_sector
+                        if in_final_cluster and in_final_sector:
+                            # strip trailing NULs and the EOF marker with a single scan
+                            stripped_data = cluster_sector_data.rstrip(b"\0")
+                            if stripped_data.endswith(b"\x1a"):
+                                cluster_sector_data = stripped_data[:-1]
+                        cluster_sector_list.append(
+                            (
+                                sector_info.sec_num,
+                                sector_info.actual_data_offset,
+                                sector_info.sector_data_size,
+                                sector_info.sectors_in_track,
+                                cluster_sec_num,
+                                cluster_sector_data,
+                            )
+                        )
                     if cluster_sector_data is None:
                         entry.errors.update({"Missing sector"})
                         if cluster_sector_list:
                             logger.append(
-                                f"{'':8}Cluster {cluster:02X}, Track {cluster_track:3}, Side {cluster_side}: "
+                                f"{'':8}Cluster {cluster:02X}, Track {cluster_track_and_side.track:3}, Side {cluster_track_and_side.side}: "
                                 + ", ".join(
                                     f"{s[4]:2}:{len(s[5])}" for s in cluster_sector_list
                                 )
                             )
                         logger.append(
-                            f"Cluster {cluster:02X}: missing track {cluster_track:3}, side {cluster_side}, sector {cluster_sec_num:2} !!!"
+                            f"Cluster {cluster:02X}: missing track {cluster_track_and_side.track:3}, side {cluster_track_and_side.side}, sector {cluster_sec_num:2} !!!"
                         )
-                        file_data = None
+                        file_data_chunks = None
                         break
-                    file_data += cluster_sector_data
-                if file_data is not None:
+                    file_data_chunks.append(cluster_sector_data)
+                if file_data_chunks is not None:
                     logger.append(
-                        f"{'':8}Cluster {cluster:02X}, Track {cluster_track:3}, Side {cluster_side}: "
+                        f"{'':8}Cluster {cluster:02X}, Track {cluster_track_and_side.track:3}, Side {cluster_track_and_side.side}: "
                         + ", ".join(
                             f"{s[4]:2}:{len(s[5])}" for s in cluster_sector_list
                         )
                     )
                 else:
                     error_count += 1
+            file_data = (
+                None if file_data_chunks is None else b"".join(file_data_chunks)
+            )
             metadata_track_info.directory_entries[offset_in_directory_entries] = (
-                make_directory_entry(
-                    idx=entry.idx,
-                    host_fs_name=entry.host_fs_name,
-                    host_fs_deobf_name=entry.host_fs_deobf_name,
-                    fattrs=entry.fattrs,
-                    cluster=entry.cluster,
-                    name=entry.name,
-                    ext=entry.ext,
-                    chain=entry.chain,
-                    errors=entry.errors,
-                    allocated_size=entry.allocated_size,
-                    raw_entry=entry.raw_entry,
-                    file_data=file_data,
-                )
+                entry._replace(file_data=file_data)
             )
     return error_count
 
 
-def log_directory_entries(
-    *, fat8_info: FAT8Info, metadata_track_info: MetadataTrackInfo, logger: Logger
+def log_directory_entries_and_file_contents(
+    *, fat8_info: FAT8Info, fat1, metadata_track_info: MetadataTrackInfo, logger: Logger
 ):
+    # a single pass over the entries; the file contents section is
+    # collected separately and logged after the directory entries
+    file_contents: List[str] = []
+    file_contents_logger = Logger(
+        append=file_contents.append, contents=lambda: file_contents
+    )
     logger.append("\n== Directory Entries ==")
 
-    for idx, entry in sorted(
-        (ent.idx, ent) for ent in metadata_track_info.directory_entries
-    ):
-        unlisted = True if UNLISTED_ENTRY_ATTRS.intersection(entry.fattrs) else False
+    for entry in metadata_track_info.directory_entries:
+        unlisted = not UNLISTED_ENTRY_ATTRS.isdisjoint(entry.fattrs)
         sep = (
             "*"
             if ATTR_BINARY in entry.fattrs
             else "." if ATTR_NON_ASCII in entry.fattrs else " "
         )
+        clusters = (
+            entry.allocated_size + fat8_info.fat8_bytes_per_cluster - 1
+        ) // fat8_info.fat8_bytes_per_cluster
         logger.append(
-            f"{entry.idx:3}. {'[' if unlisted else ' '}{entry.name}{sep}{entry.ext}{']' if unlisted else ' '} {(entry.allocated_size + fat8_info.fat8_bytes_per_cluster - 1) // fat8_info.fat8_bytes_per_cluster:3d} {quote_filename(entry.host_fs_name)+('' if ATTR_OBFUSCATED not in entry.fattrs or fat8_info.fat8_obfuscation is None else ', ' + quote_filename(entry.host_fs_deobf_name)):40} {len(entry.file_data or b''):8} ATTRS={entry.fattrs or None}  START={entry.cluster:02X} CHAIN={'→'.join(f'{cluster:02X}' for cluster in entry.chain) if entry.chain else None} STATUS={entry.errors or 'OK'}"
+            f"{entry.idx:3}. {'[' if unlisted else ' '}{entry.name}{sep}{entry.ext}{']' if unlisted else ' '} {clusters:3d} {quote_filename(entry.host_fs_name)+('' if ATTR_OBFUSCATED not in entry.fattrs or fat8_info.fat8_obfuscation is None else ', ' + quote_filename(entry.host_fs_deobf_name)):40} {len(entry.file_data or b''):8} ATTRS={entry.fattrs or None}  START={entry.cluster:02X} CHAIN={'→'.join(f'{cluster:02X}' for cluster in entry.chain) if entry.chain else None} STATUS={entry.errors or 'OK'}"
         )
+        if fat1 is None:
+            continue
+        elif PSEUDO_ATTR_DELETED in entry.fattrs:
+            continue
+        elif PSEUDO_ATTR_UNUSED in entry.fattrs:
+            continue
+        errors = entry.errors
+        if not errors:
+            file_contents_logger.append(
+                f"{entry.idx:3}. {'[' if unlisted else ' '}{entry.name}{sep}{entry.ext}{']' if unlisted else ' '} {clusters:3d} {quote_filename(entry.host_fs_name):27} {len(entry.file_data or b''):8} ╭{'─' * 16}╮"
+                + (
+                    ""
+                    if ATTR_OBFUSCATED not in entry.fattrs
+                    or fat8_info.fat8_obfuscation is None
+                    else f" {quote_filename(entry.host_fs_deobf_name):50} ╭{'─' * 16}╮"
+                )
+            )
+            if entry.file_data is not None:
+                hexdump_entry_data(
+                    entry.file_data,
+                    entry.fattrs,
+                    fat8_info=fat8_info,
+                    logger=file_contents_logger,
+                )
 
-
-def log_file_contents(
-    *, fat8_info: FAT8Info, fat1, metadata_track_info: MetadataTrackInfo, logger: Logger
-):
     if fat1 is not None:
         logger.append(f"\n== File Contents ==")
+        for line in file_contents:
+            logger.append(line)
 
-        for idx, entry in sorted(
-            (ent.idx, ent) for ent in metadata_track_info.directory_entries
-        ):
-            if PSEUDO_ATTR_DELETED in entry.fattrs:
-                continue
-            elif PSEUDO_ATTR_UNUSED in entry.fattrs:
-                continue
-            unlisted = (
-                True if UNLISTED_ENTRY_ATTRS.intersection(entry.fattrs) else False
-            )
-            errors = entry.errors
-            if not errors:
-                sep = (
-                    "*"
-                    if ATTR_BINARY in entry.fattrs
-                    else "." if ATTR_NON_ASCII in entry.fattrs else " "
-                )
-                logger.append(
-                    f"{entry.idx:3}. {'[' if unlisted else ' '}{entry.name}{sep}{entry.ext}{']' if unlisted else ' '} {(entry.allocated_size + fat8_info.fat8_bytes_per_cluster - 1) // fat8_info.fat8_bytes_per_cluster:3d} {quote_filename(entry.host_fs_name):27} {len(entry.file_data or b''):8} ╭{'─' * 16}╮"
-                    + (
-                        ""
-                        if ATTR_OBFUSCATED not in entry.fattrs
-                        or fat8_info.fat8_obfuscation is None
-                        else f" {quote_filename(entry.host_fs_deobf_name):50} ╭{'─' * 16}╮"
-                    )
-                )
-                if entry.file_data is not None:
-                    hexdump_entry_data(
-                        entry.file_data,
-                        entry.fattrs,
-                        fat8_info=fat8_info,
-                        logger=logger,
-                    )
 
+class OutputFiles(NamedTuple):
+    write_bytes: Callable[[str, bytes], None]
+    write_text: Callable[[str, str], None]
+    close: Callable[[], None]
 
-def save_log(*, outdir, logger: Logger):
-    log_filename = os.path.join(outdir, "_fat8_d88_output.txt")
-    with open(log_filename, "w", encoding="utf-8") as f:
-        print(f"writing {log_filename}")
-        f.write("\n".join(logger.contents()))
+
+def start_output_directory(outdir) -> OutputFiles:
+    print(f"mkdir {outdir}")
+    os.mkdir(outdir)
+
+    def write_bytes(name: str, data: bytes):
+        filename = os.path.join(outdir, name)
+        with open(filename, "wb") as f:
+            print(f"writing {filename}")
+            f.write(data)
+
+    def write_text(name: str, text: str):
+        filename = os.path.join(outdir, name)
+        with open(filename, "w", encoding="utf-8") as f:
+            print(f"writing {filename}")
+            f.write(text)
+
+    return OutputFiles(
+        write_bytes=write_bytes, write_text=write_text, close=lambda: None
+    )
+
+
+def start_output_zip(outdir) -> OutputFiles:
+    # one uncompressed archive per disk image instead of a directory of
+    # many small files; members are stored under outdir/ so that
+    # unpacking the archive gives the same layout as directory output
+    zip_filename = outdir + ".zip"
+    print(f"creating {zip_filename}")
+    zip_file = zipfile.ZipFile(zip_filename, "x", zipfile.ZIP_STORED)
+
+    def write_bytes(name: str, data: bytes):
+        print(f"writing {zip_filename}: {outdir}/{name}")
+        zip_file.writestr(f"{outdir}/{name}", data)
+
+    def write_text(name: str, text: str):
+        write_bytes(name, text.encode("utf-8"))
+
+    return OutputFiles(
+        write_bytes=write_bytes, write_text=write_text, close=zip_file.close
+    )
+
+
+def save_log(*, output: OutputFiles, logger: Logger):
+    output.write_text("_fat8_d88_output.txt", "\n".join(logger.contents()))
 
 
 def utf8_dump_filename(filename):
@@ -2573,20 +2949,24 @@ def utf8_dump_filename(filename):
     return "_".join(parts) + "_utf8_dump.txt"
 
 
-def extract_boot_sector(*, outdir, fat8_info: FAT8Info):
+def write_data_and_utf8_dump(filename, data, text, *, output: OutputFiles):
+    output.write_bytes(filename, data)
+    output.write_text(utf8_dump_filename(filename), text)
+
+
+def extract_boot_sector(*, output: OutputFiles, fat8_info: FAT8Info):
     if fat8_info.boot_sector is not None:
-        boot_sector_filename = os.path.join(outdir, "_boot_sector.dat")
-        with open(boot_sector_filename, "wb") as f:
-            print(f"writing {boot_sector_filename}")
-            f.write(fat8_info.boot_sector)
-        with open(utf8_dump_filename(boot_sector_filename), "w", encoding="utf-8") as f:
-            print(f"writing {utf8_dump_filename(boot_sector_filename)}")
-            f.write(fat8_info.decode_8bit_charset(fat8_info.boot_sector))
+        write_data_and_utf8_dump(
+            "_boot_sector.dat",
+            fat8_info.boot_sector,
+            decode_8bit_metadata(fat8_info.boot_sector, fat8_info=fat8_info),
+            output=output,
+        )
 
 
 def extract_raw_directory_sectors(
     *,
-    outdir,
+    output: OutputFiles,
     fat8_info: FAT8Info,
     metadata_indices: MetadataIndices,
     metadata_track_info: MetadataTrackInfo,
@@ -2595,79 +2975,65 @@ def extract_raw_directory_sectors(
         sector_data = metadata_track_info.raw_metadata_sectors.get(vsec_num)
         if sector_data is None:
             continue
-        if sector_data == b"\xff" * len(sector_data):
+        if not sector_data.rstrip(b"\xff"):
             # Do not write out unused directory sector files
             continue
-        dir_sector_filename = os.path.join(outdir, f"_dir_sector_{vsec_num}.dat")
-        with open(dir_sector_filename, "wb") as f:
-            print(f"writing {dir_sector_filename}")
-            f.write(sector_data)
-        with open(utf8_dump_filename(dir_sector_filename), "w", encoding="utf-8") as f:
-            print(f"writing {utf8_dump_filename(dir_sector_filename)}")
-            f.write(fat8_info.decode_8bit_charset(sector_data))
+        write_data_and_utf8_dump(
+            f"_dir_sector_{vsec_num}.dat",
+            sector_data,
+            decode_8bit_metadata(sector_data, fat8_info=fat8_info),
+            output=output,
+        )
 
 
 def extract_autorun_data(
-    *, outdir, fat8_info: FAT8Info, metadata_track_info: MetadataTrackInfo
+    *, output: OutputFiles, fat8_info: FAT8Info, metadata_track_info: MetadataTrackInfo
 ):
     if metadata_track_info.autorun_data is not None:
-        autorun_filename = os.path.join(outdir, "_AutoRun.dat")
-        with open(autorun_filename, "wb") as f:
-            print(f"writing {autorun_filename}")
-            f.write(metadata_track_info.autorun_data)
-        with open(utf8_dump_filename(autorun_filename), "w", encoding="utf-8") as f:
-            print(f"writing {utf8_dump_filename(autorun_filename)}")
-            f.write(fat8_info.decode_8bit_charset(metadata_track_info.autorun_data))
+        write_data_and_utf8_dump(
+            "_AutoRun.dat",
+            metadata_track_info.autorun_data,
+            decode_8bit_metadata(metadata_track_info.autorun_data, fat8_info=fat8_info),
+            output=output,
+        )
 
 
 def extract_fat_sectors(
-    *, outdir, fat8_info: FAT8Info, metadata_track_info: MetadataTrackInfo
+    *, output: OutputFiles, fat8_info: FAT8Info, metadata_track_info: MetadataTrackInfo
 ):
     for fat_sector_idx, fat in sorted(metadata_track_info.fat_sectors.items()):
-        fat_filename = os.path.join(outdir, f"_fat_sector_{fat_sector_idx}.dat")
-        with open(fat_filename, "wb") as f:
-            print(f"writing {fat_filename}")
-            f.write(fat)
-        with open(utf8_dump_filename(fat_filename), "w", encoding="utf-8") as f:
-            print(f"writing {utf8_dump_filename(fat_filename)}")
-            f.write(fat8_info.decode_8bit_charset(fat))
+        write_data_and_utf8_dump(
+            f"_fat_sector_{fat_sector_idx}.dat",
+            fat,
+            decode_8bit_metadata(fat, fat8_info=fat8_info),
+            output=output,
+        )
 
 
 def extract_file_contents(
-    *, outdir, fat8_info: FAT8Info, metadata_track_info: MetadataTrackInfo
+    *, output: OutputFiles, fat8_info: FAT8Info, metadata_track_info: MetadataTrackInfo
 ):
-    for idx, entry in sorted(
-        (ent.idx, ent) for ent in metadata_track_info.directory_entries
-    ):
+    for entry in metadata_track_info.directory_entries:
         errors = entry.errors
         if entry.file_data is not None and not errors:
-            entry_filename = os.path.join(outdir, entry.host_fs_name)
             file_data = entry.file_data
-            with open(entry_filename, "wb") as f:
-                print(f"writing {entry_filename}")
-                f.write(file_data)
-            with open(utf8_dump_filename(entry_filename), "w", encoding="utf-8") as f:
-                print(f"writing {utf8_dump_filename(entry_filename)}")
-                f.write(fat8_info.decode_8bit_charset(file_data))
+            write_data_and_utf8_dump(
+                entry.host_fs_name,
+                file_data,
+                fat8_info.decode_8bit_charset(file_data),
+                output=output,
+            )
             if (
                 ATTR_OBFUSCATED in entry.fattrs
                 and fat8_info.fat8_obfuscation is not None
             ):
-                file_deobf_data = bytes(
-                    [
-                        fat8_info.deobfuscate_byte(i, byt)
-                        for i, byt in enumerate(file_data)
-                    ]
+                file_deobf_data = fat8_info.deobfuscate_bytes(file_data)
+                write_data_and_utf8_dump(
+                    entry.host_fs_deobf_name,
+                    file_deobf_data,
+                    fat8_info.decode_8bit_charset(file_deobf_data),
+                    output=output,
                 )
-                entry_deobf_filename = os.path.join(outdir, entry.host_fs_deobf_name)
-                with open(entry_deobf_filename, "wb") as f:
-                    print(f"writing {entry_deobf_filename}")
-                    f.write(file_deobf_data)
-                with open(
-                    utf8_dump_filename(entry_deobf_filename), "w", encoding="utf-8"
-                ) as f:
-                    print(f"writing {utf8_dump_filename(entry_deobf_filename)}")
-                    f.write(fat8_info.decode_8bit_charset(file_deobf_data))
 
 
 def extract_everything(
@@ -2679,6 +3045,7 @@ def extract_everything(
     metadata_track_info: MetadataTrackInfo,
     error_count: int,
     logger: Logger,
+    zip_output: bool = False,
 ):
     outdir = (
         os.path.splitext(os.path.basename(d88_path))[0]
@@ -2688,33 +3055,37 @@ def extract_everything(
     )
 
     disambig = ""
-    while os.path.exists(outdir + disambig):
+    while os.path.exists(outdir + disambig + (".zip" if zip_output else "")):
         disambig = f" ({1 + int(disambig.strip(' ()') or 0)})"
     outdir += disambig
 
     print("\n== Extracting ==")
-    print(f"mkdir {outdir}")
-    os.mkdir(outdir)
-    save_log(outdir=outdir, logger=logger)
-    extract_boot_sector(outdir=outdir, fat8_info=fat8_info)
-    extract_raw_directory_sectors(
-        outdir=outdir,
-        fat8_info=fat8_info,
-        metadata_indices=metadata_indices,
-        metadata_track_info=metadata_track_info,
-    )
-    extract_autorun_data(
-        outdir=outdir, fat8_info=fat8_info, metadata_track_info=metadata_track_info
-    )
-    extract_fat_sectors(
-        outdir=outdir, fat8_info=fat8_info, metadata_track_info=metadata_track_info
-    )
-    extract_file_contents(
-        outdir=outdir, fat8_info=fat8_info, metadata_track_info=metadata_track_info
-    )
+    output = start_output_zip(outdir) if zip_output else start_output_directory(outdir)
+    try:
+        save_log(output=output, logger=logger)
+        extract_boot_sector(output=output, fat8_info=fat8_info)
+        extract_raw_directory_sectors(
+            output=output,
+            fat8_info=fat8_info,
+            metadata_indices=metadata_indices,
+            metadata_track_info=metadata_track_info,
+        )
+        extract_autorun_data(
+            output=output, fat8_info=fat8_info, metadata_track_info=metadata_track_info
+        )
+        extract_fat_sectors(
+            output=output, fat8_info=fat8_info, metadata_track_info=metadata_track_info
+        )
+        extract_file_contents(
+            output=output, fat8_info=fat8_info, metadata_track_info=metadata_track_info
+        )
+    finally:
+        output.close()
 
 
-def fat8_d88_tool(*, d88_path: str, d88_data: bytes, disk_idx: int = 1) -> int:
+def fat8_d88_tool(
+    *, d88_path: str, d88_data: bytes, disk_idx: int = 1, zip_output: bool = False
+) -> int:
     error_count = 0
     logger = start_log()
     disk_info = analyze_disk(d88_data=d88_data, disk_idx=disk_idx)
@@ -2770,10 +3141,7 @@ def fat8_d88_tool(*, d88_path: str, d88_data: bytes, disk_idx: int = 1) -> int:
         metadata_track_info=metadata_track_info,
         logger=logger,
     )
-    log_directory_entries(
-        fat8_info=fat8_info, metadata_track_info=metadata_track_info, logger=logger
-    )
-    log_file_contents(
+    log_directory_entries_and_file_contents(
         fat8_info=fat8_info,
         fat1=fat1,
         metadata_track_info=metadata_track_info,
@@ -2788,6 +3156,7 @@ def fat8_d88_tool(*, d88_path: str, d88_data: bytes, disk_idx: int = 1) -> int:
         metadata_track_info=metadata_track_info,
         error_count=error_count,
         logger=logger,
+        zip_output=zip_output,
     )
     print(f"\nFinished processing disk{disk_info.disk_suffix}: {error_count} error(s)")
     if len(d88_data) > disk_info.disk_sz:
@@ -2795,6 +3164,7 @@ def fat8_d88_tool(*, d88_path: str, d88_data: bytes, disk_idx: int = 1) -> int:
             d88_path=d88_path,
             d88_data=d88_data[disk_info.disk_sz :],
             disk_idx=disk_idx + 1,
+            zip_output=zip_output,
         )
     return error_count
 
@@ -2802,6 +3172,7 @@ def fat8_d88_tool(*, d88_path: str, d88_data: bytes, disk_idx: int = 1) -> int:
 def smoke_test_everything():
     smoke_test_pc98_8bit_charset()
     smoke_test_pc6001_8bit_charset()
+    smoke_test_pc_8bit_codecs()
     smoke_test_pc98_deobfuscation()
     smoke_test_p88_deobfuscation()
 
@@ -2835,6 +3206,11 @@ def main():
     )
 
     # D88 files for disk image extraction
+    parser.add_argument(
+        "--zip",
+        action="store_true",
+        help="Write each disk image's extracted files to an uncompressed ZIP archive instead of a directory",
+    )
     parser.add_argument(
         "d88_files",
         nargs="*",
@@ -2940,6 +3316,10 @@ def main():
         print(
             "A log file for each disk image will be written to stdout and also to a file `_fat8_d88_output.txt` inside the created directory. Additional files beginning with `_` may be written for things like boot sectors, directory sectors, autorun/ID data, and FAT sectors."
         )
+        print("")
+        print(
+            "With `--zip`, the files for each disk image are instead written to an uncompressed ZIP archive named like the output directory plus `.zip`, and unpacking it recreates that directory."
+        )
         print("## Character set filter modes:")
         print(
             "In character set filter modes, character set translation proceeds one line at a time from stdin to stdout."
@@ -2956,7 +3336,9 @@ def main():
                 d88_path = "stdin"
             print(f"Processing D88 file {d88_path}.")
             try:
-                error_count = fat8_d88_tool(d88_path=d88_path, d88_data=d88_data)
+                error_count = fat8_d88_tool(
+                    d88_path=d88_path, d88_data=d88_data, zip_output=args.zip
+                )
                 print(
                     f"Finished processing D88 file {d88_path}: {error_count} error(s)."
                 )